@@ -1,8 +1,9 @@
-from flask import Flask, request, abort
-import json
+from flask import Flask, request, jsonify
+import os
 from functools import wraps
-from jose import jwt
-from urllib.request import urlopen
+
+from fsnd_auth.jwks import JWKSCache, TokenVerifier
+from fsnd_auth.token_cache import TokenCache
 
 
 app = Flask(__name__)
@@ -11,6 +12,13 @@ AUTH0_DOMAIN = 'dev-ii24r-9s.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'image'
 
+# the key set is fetched once, kept in memory and refreshed by a background thread, see fsnd_auth/jwks.py
+jwks_cache = JWKSCache(
+    os.environ.get('JWKS_SOURCE', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'),
+    ttl=int(os.environ.get('JWKS_TTL', 3600)),
+    refresh_interval=float(os.environ['JWKS_REFRESH_INTERVAL']) if 'JWKS_REFRESH_INTERVAL' in os.environ else None
+)
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -18,6 +26,18 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+verifier = TokenVerifier(jwks_cache, AUTH0_DOMAIN, API_AUDIENCE, ALGORITHMS, AuthError)
+
+
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+        'success': False,
+        'error': error.status_code,
+        'message': error.error['description']
+    }), error.status_code
+
+
 def get_token_auth_header():
     """Obtains the Access Token from the Authorization Header
     """
@@ -52,57 +72,27 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    if 'kid' not in unverified_header:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization malformed.'
-        }, 401)
+    """Verifies the signature and the claims of the token with the cached keys,
+    raises AuthError if the token is not valid
+    """
+    return verifier.verify(token)
+
+
+# payloads of the tokens already verified, see fsnd_auth/token_cache.py
+token_cache = TokenCache(
+    max_entries=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+    max_ttl=int(os.environ.get('TOKEN_CACHE_TTL', 300))
+)
+
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    if rsa_key:
-        try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
-
-            return payload
-
-        except jwt.ExpiredSignatureError:
-            raise AuthError({
-                'code': 'token_expired',
-                'description': 'Token expired.'
-            }, 401)
-
-        except jwt.JWTClaimsError:
-            raise AuthError({
-                'code': 'invalid_claims',
-                'description': 'Incorrect claims. Please, check the audience and issuer.'
-            }, 401)
-        except Exception:
-            raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to parse authentication token.'
-            }, 400)
-    raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to find the appropriate key.'
-            }, 400)
+def verify_token(token):
+    """Verifies the token with verify_decode_jwt the first time it is seen only
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify_decode_jwt(token)
+        token_cache.put(token, payload, payload.get('exp'))
+    return payload
 
 
 def check_permissions(permission, payload):
@@ -125,11 +115,7 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            try:
-                payload = verify_decode_jwt(token)
-            except:
-                abort(401)
-            
+            payload = verify_token(token)
             check_permissions(permission, payload)
 
             return f(payload, *args, **kwargs)
@@ -137,6 +123,18 @@ def requires_auth(permission=''):
     return requires_auth_decorator
 
 
+@app.route('/metrics/auth')
+def auth_metrics():
+    """Reports the verification keys of this process: number of keys, age,
+    fetches (count, failures, latency) and key lookups (hits, misses)
+    """
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'jwks': jwks_cache.metrics()
+    })
+
+
 # @app.route('/headers')
 # @requires_auth
 # def headers(payload):
@@ -0,0 +1,170 @@
+import base64
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+# the tokens of the tests are verified against a local key set, written in setUpClass
+JWKS_PATH = os.path.join(tempfile.gettempdir(), 'basic-flask-auth-test-jwks.json')
+os.environ['JWKS_SOURCE'] = JWKS_PATH
+
+from app import app, AUTH0_DOMAIN, API_AUDIENCE, jwks_cache, token_cache
+from fsnd_auth.jwks import JWKSCache
+
+KID = 'test'
+
+
+def base64url(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def jwk(key, kid):
+    return {
+        'kty': 'RSA', 'kid': kid, 'use': 'sig', 'alg': 'RS256',
+        'n': base64url(key.n), 'e': base64url(key.e)
+    }
+
+
+def write_key_set(*keys):
+    with open(JWKS_PATH, 'w') as jwks_file:
+        json.dump({'keys': list(keys)}, jwks_file)
+
+
+class BasicFlaskAuthTestCase(unittest.TestCase):
+    """This class represents the token verification test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.key = RSA.generate(2048)
+        cls.other_key = RSA.generate(2048)
+        write_key_set(jwk(cls.key, KID))
+
+    @classmethod
+    def tearDownClass(cls):
+        jwks_cache.stop()
+        os.remove(JWKS_PATH)
+
+    def setUp(self):
+        self.client = app.test_client
+        token_cache.clear()
+        # every unknown kid fetches the key set again
+        jwks_cache.min_refresh_interval = 0
+
+    def tearDown(self):
+        write_key_set(jwk(self.key, KID))
+
+    def headers(self, key=None, kid=KID, expires_in=3600, permissions=('get:images',)):
+        claims = {
+            'iss': 'https://' + AUTH0_DOMAIN + '/',
+            'aud': API_AUDIENCE,
+            'sub': 'test',
+            'exp': int(time.time()) + expires_in,
+            'permissions': list(permissions)
+        }
+        private_key = (key or self.key).exportKey('PEM').decode('ascii')
+        token = jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+        return {'Authorization': 'Bearer ' + token}
+
+    def metrics(self):
+        return self.client().get('/metrics/auth').get_json()['jwks']
+
+    # waits for the background fetches of the key set, returns the number of fetches
+    def wait_for_fetches(self, fetches):
+        for _ in range(200):
+            if self.metrics()['fetches'] >= fetches and not jwks_cache.refreshing:
+                break
+            time.sleep(0.01)
+        return self.metrics()['fetches']
+
+    # a valid token with the get:images permission should be granted access
+    def test_200_valid_token(self):
+        res = self.client().get('/images', headers=self.headers())
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, b'Access Granted')
+
+    # a valid token without the get:images permission should return 403 response
+    def test_403_missing_permission(self):
+        res = self.client().get('/images', headers=self.headers(permissions=['post:images']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(data['success'], False)
+
+    # an expired token should return 401 response
+    def test_401_expired_token(self):
+        res = self.client().get('/images', headers=self.headers(expires_in=-60))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(data['message'], 'Token expired.')
+
+    # a token signed with another key under a known kid should return 400 response
+    def test_400_bad_signature(self):
+        res = self.client().get('/images', headers=self.headers(key=self.other_key))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['message'], 'Unable to parse authentication token.')
+
+    # a token signed with an unknown kid should be rejected, and the key set fetched in the background
+    def test_400_unknown_kid(self):
+        self.client().get('/images', headers=self.headers())
+        before = self.metrics()
+
+        res = self.client().get('/images', headers=self.headers(key=self.other_key, kid='unknown'))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['message'], 'Unable to find the appropriate key.')
+        self.assertEqual(self.metrics()['key_misses'], before['key_misses'] + 1)
+        self.assertEqual(self.wait_for_fetches(before['fetches'] + 1), before['fetches'] + 1)
+
+    # an unknown kid should not wait for the fetch of the key set once the keys are warm
+    def test_unknown_kid_does_not_wait_for_the_network(self):
+        cache = JWKSCache(JWKS_PATH, min_refresh_interval=0, refresh_interval=0)
+        self.assertIsNotNone(cache.get_key(KID))
+        fetch = cache.fetch
+
+        def slow_fetch():
+            time.sleep(1)
+            return fetch()
+        cache.fetch = slow_fetch
+
+        started = time.perf_counter()
+        self.assertIsNone(cache.get_key('unknown'))
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+    # unknown kids fetch the key set at most once every min_refresh_interval
+    def test_400_unknown_kid_rate_limited(self):
+        self.client().get('/images', headers=self.headers(kid='unknown'))
+        fetches = self.wait_for_fetches(self.metrics()['fetches'])
+        jwks_cache.min_refresh_interval = 3600
+
+        for _ in range(3):
+            res = self.client().get('/images', headers=self.headers(kid='unknown'))
+            self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.wait_for_fetches(fetches), fetches)
+
+    # a key added to the key set (rotation) should be accepted once the background fetch is done
+    def test_200_rotated_key(self):
+        self.client().get('/images', headers=self.headers())
+        fetches = self.metrics()['fetches']
+        write_key_set(jwk(self.key, KID), jwk(self.other_key, 'rotated'))
+
+        res = self.client().get('/images', headers=self.headers(key=self.other_key, kid='rotated'))
+        self.assertEqual(res.status_code, 400)
+        self.wait_for_fetches(fetches + 1)
+
+        res = self.client().get('/images', headers=self.headers(key=self.other_key, kid='rotated'))
+        self.assertEqual(res.status_code, 200)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
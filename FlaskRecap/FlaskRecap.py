@@ -1,33 +1,33 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort
+
+from greeting_store import create_greeting_store
 
 app = Flask(__name__)
 
-greetings = {
-            'en': 'hello', 
-            'es': 'Hola', 
-            'ar': 'مرحبا',
-            'ru': 'Привет',
-            'fi': 'Hei',
-            'he': 'שלום',
-            'ja': 'こんにちは'
-            }
+greetings = create_greeting_store()
 
 @app.route('/greeting', methods=['GET'])
 def greeting_all():
-    return jsonify({'greetings': greetings})
+    body, etag = greetings.document()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/greeting/<lang>', methods=['GET'])
 def greeting_one(lang):
     print(lang)
-    if(lang not in greetings):
+    greeting = greetings.get(lang)
+    if(greeting is None):
         abort(404)
-    return jsonify({'greeting': greetings[lang
-    ]})
+    return jsonify({'greeting': greeting})
 
 @app.route('/greeting', methods=['POST'])
 def greeting_add():
-    info = request.get_json()
-    if('lang' not in info or 'greeting' not in info):
+    info = request.get_json(silent=True)
+    if(not isinstance(info, dict) or not isinstance(info.get('lang'), str)
+            or not isinstance(info.get('greeting'), str)):
+        # the greetings map only holds strings, see GreetingStore.document()
         abort(422)
-    greetings[info['lang']] = info['greeting']
-    return jsonify({'greetings':greetings})
+    greetings.put(info['lang'], info['greeting'])
+    return jsonify({'greetings': {info['lang']: info['greeting']}})
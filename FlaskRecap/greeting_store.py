@@ -0,0 +1,141 @@
+import abc
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+DEFAULT_GREETINGS = {
+    'en': 'hello',
+    'es': 'Hola',
+    'ar': 'مرحبا',
+    'ru': 'Привет',
+    'fi': 'Hei',
+    'he': 'שלום',
+    'ja': 'こんにちは'
+}
+
+
+class GreetingStore(abc.ABC):
+    """Storage of the {lang: greeting} map.
+
+    snapshot() returns (version, greetings). A snapshot is never modified once
+    it has been returned, every put() makes a new one, so readers share it
+    without locking. The JSON document of the map and its ETag are built once
+    per version.
+    """
+    document_cache = (None, None, None)
+
+    @abc.abstractmethod
+    def snapshot(self):
+        """Returns (version, greetings), the current snapshot of the map
+        """
+
+    @abc.abstractmethod
+    def put(self, lang, greeting):
+        """Stores the greeting of lang and returns the new version
+        """
+
+    def get(self, lang):
+        return self.snapshot()[1].get(lang)
+
+    def document(self):
+        """Returns the JSON body of GET /greeting and its ETag
+        """
+        version, greetings = self.snapshot()
+        cached = self.document_cache
+        if cached[0] != version:
+            body = json.dumps({'greetings': greetings}, sort_keys=True).encode('utf-8')
+            cached = self.document_cache = (version, body, hashlib.sha256(body).hexdigest())
+        return cached[1], cached[2]
+
+
+class MemoryGreetingStore(GreetingStore):
+    """Greetings kept in the process: writes copy the map and swap the snapshot
+    under a lock, reads never lock.
+    """
+    def __init__(self, initial=None):
+        self.lock = threading.Lock()
+        self.current = (0, dict(initial or {}))
+
+    def snapshot(self):
+        return self.current
+
+    def put(self, lang, greeting):
+        with self.lock:
+            version, greetings = self.current
+            greetings = dict(greetings)
+            greetings[lang] = greeting
+            self.current = (version + 1, greetings)
+            return version + 1
+
+
+class SQLiteGreetingStore(GreetingStore):
+    """Greetings kept in a SQLite database, shared by all the worker processes
+    and kept across restarts. Every write increments a version stored with the
+    greetings; a read only queries that version and reloads the map when
+    another process (or thread) changed it.
+    """
+    def __init__(self, path, initial=None):
+        self.path = path
+        self.local = threading.local()
+        self.current = (None, {})
+
+        connection = self.connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS greetings (lang TEXT PRIMARY KEY, greeting TEXT NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS greetings_version (version INTEGER NOT NULL)')
+            if connection.execute('SELECT version FROM greetings_version').fetchone() is None:
+                # first run: the database is seeded once, by the first worker
+                connection.executemany('INSERT OR IGNORE INTO greetings (lang, greeting) VALUES (?, ?)',
+                                       list((initial or {}).items()))
+                connection.execute('INSERT INTO greetings_version (version) VALUES (1)')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # autocommit mode, the transactions are explicit
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        return connection
+
+    def snapshot(self):
+        connection = self.connection()
+        connection.execute('BEGIN')
+        try:
+            version = connection.execute('SELECT version FROM greetings_version').fetchone()[0]
+            current = self.current
+            if current[0] != version:
+                greetings = dict(connection.execute('SELECT lang, greeting FROM greetings'))
+                current = self.current = (version, greetings)
+        finally:
+            connection.execute('COMMIT')
+        return current
+
+    def put(self, lang, greeting):
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR REPLACE INTO greetings (lang, greeting) VALUES (?, ?)', (lang, greeting))
+            connection.execute('UPDATE greetings_version SET version = version + 1')
+            version = connection.execute('SELECT version FROM greetings_version').fetchone()[0]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return version
+
+
+def create_greeting_store():
+    """GREETING_STORE selects the backend: 'memory' (default) or 'sqlite', which
+    stores the greetings in GREETING_DATABASE (default greetings.db)
+    """
+    if os.environ.get('GREETING_STORE', 'memory') == 'sqlite':
+        return SQLiteGreetingStore(os.environ.get('GREETING_DATABASE', 'greetings.db'), DEFAULT_GREETINGS)
+    return MemoryGreetingStore(DEFAULT_GREETINGS)
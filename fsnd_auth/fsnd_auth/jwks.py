@@ -0,0 +1,310 @@
+'''
+Verification of the Auth0 tokens against an in-process cache of the JSON Web
+Key Set, shared by the apps of the repository which use Auth0 (BasicFlaskAuth
+and the coffee shop backend).
+
+The key set is read from a source, which is either a URL (the Auth0
+/.well-known/jwks.json endpoint by default) or a local file, so the apps can
+be run and tested offline against a locally generated key set:
+
+    JWKS_SOURCE             URL or file path of the key set
+    JWKS_TTL                seconds the keys are fresh (default 3600)
+    JWKS_REFRESH_INTERVAL   seconds between two fetches of the refresher thread
+                            (default JWKS_TTL / 2, 0 disables the thread)
+
+The first use of the keys starts a refresher thread, which fetches the key set
+again every refresh interval, so the keys never get stale. Only the very first
+verification of a process (and any verification once the keys are older than
+max_stale) waits for the network: once the keys are warm, stale keys are
+served while a background fetch runs, and a token signed with an unknown kid
+(e.g. after a key rotation) is rejected while the key set is fetched in the
+background. Fetches triggered by requests happen at most once every
+min_refresh_interval seconds, so that tokens with made-up kids cannot hammer
+the identity provider.
+
+metrics() reports the fetches (count, failures, latency) and the key lookups
+(hits and misses) of the process.
+'''
+
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+from jose import jwt
+
+
+'''
+JWKSUnavailable Exception
+raised when there are no usable keys because the key set cannot be fetched
+'''
+class JWKSUnavailable(Exception):
+    pass
+
+
+class JWKSCache:
+    def __init__(self, source, ttl=3600, max_stale=86400, min_refresh_interval=30, timeout=5,
+                 refresh_interval=None):
+        self.source = source
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.refresh_interval = ttl / 2 if refresh_interval is None else refresh_interval
+        self.keys = {}
+        self.fetched_at = None
+        self.attempted_at = None
+        self.refreshing = False
+        self.refresher = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+        self.metrics_lock = threading.Lock()
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.fetch_seconds_total = 0.0
+        self.fetch_seconds_max = 0.0
+        self.fetch_seconds_last = None
+        self.last_error = None
+        self.hits = 0
+        self.misses = 0
+
+    '''
+    fetch()
+        reads the key set from the source and returns its keys by kid
+    '''
+    def fetch(self):
+        if self.source.startswith(('https://', 'http://')):
+            with urlopen(self.source, timeout=self.timeout) as response:
+                jwks = json.loads(response.read())
+        else:
+            path = self.source[len('file://'):] if self.source.startswith('file://') else self.source
+            with open(path) as jwks_file:
+                jwks = json.load(jwks_file)
+        return {key['kid']: key for key in jwks['keys'] if 'kid' in key}
+
+    def timed_fetch(self):
+        started = time.perf_counter()
+        try:
+            return self.fetch()
+        except Exception as error:
+            with self.metrics_lock:
+                self.fetch_failures += 1
+                self.last_error = '{}: {}'.format(type(error).__name__, error)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.metrics_lock:
+                self.fetches += 1
+                self.fetch_seconds_total += elapsed
+                self.fetch_seconds_max = max(self.fetch_seconds_max, elapsed)
+                self.fetch_seconds_last = elapsed
+
+    '''
+    refresh(max_age=None, min_interval=None)
+        fetches the key set and replaces the cached keys. Threads waiting for a fetch
+        in progress do not fetch again if the keys are now younger than max_age, or if
+        the last attempt is more recent than min_interval. Returns whether it fetched.
+        The cached keys are kept if the fetch fails, and the error is raised
+    '''
+    def refresh(self, max_age=None, min_interval=None):
+        with self.refresh_lock:
+            age = self.age()
+            if max_age is not None and age is not None and age <= max_age:
+                return False
+            if min_interval is not None and self.attempted_at is not None \
+                    and time.monotonic() - self.attempted_at < min_interval:
+                return False
+            self.attempted_at = time.monotonic()
+            keys = self.timed_fetch()
+            with self.lock:
+                self.keys = keys
+                self.fetched_at = time.monotonic()
+            return True
+
+    def refresh_in_background(self, min_interval=None):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def background_refresh():
+            try:
+                self.refresh(min_interval=min_interval)
+            except Exception:
+                # the cached keys are served until a later attempt succeeds
+                pass
+            finally:
+                with self.lock:
+                    self.refreshing = False
+
+        threading.Thread(target=background_refresh, daemon=True).start()
+
+    '''
+    start()
+        starts the refresher thread, unless it is running or disabled (refresh_interval 0).
+        It is called by the first get_key(), in the process (worker) that serves requests,
+        unless stop() was called
+    '''
+    def start(self):
+        with self.lock:
+            if self.refresher is not None or not self.refresh_interval:
+                return
+            self.stopped.clear()
+            self.refresher = threading.Thread(target=self.run_refresher, name='jwks-refresher', daemon=True)
+        self.refresher.start()
+
+    def stop(self):
+        self.stopped.set()
+        with self.lock:
+            refresher, self.refresher = self.refresher, None
+        if refresher is not None and refresher is not threading.current_thread():
+            refresher.join()
+
+    def run_refresher(self):
+        while not self.stopped.is_set():
+            try:
+                self.refresh(max_age=self.refresh_interval)
+                wait = self.refresh_interval - (self.age() or 0)
+            except Exception:
+                wait = self.min_refresh_interval
+            self.stopped.wait(max(wait, 1))
+
+    def age(self):
+        fetched_at = self.fetched_at
+        return None if fetched_at is None else time.monotonic() - fetched_at
+
+    '''
+    get_key(kid)
+        returns the key with the kid, or None if the key set has no such key.
+        Waits for a fetch when no usable keys are cached, and raises JWKSUnavailable
+        if that fetch fails. An unknown kid starts a background fetch of the key set,
+        at most once every min_refresh_interval seconds
+    '''
+    def get_key(self, kid):
+        if self.refresher is None and not self.stopped.is_set():
+            self.start()
+
+        age = self.age()
+        if age is None or age > self.max_stale:
+            try:
+                self.refresh(max_age=self.max_stale)
+            except Exception as error:
+                raise JWKSUnavailable(str(error))
+            warm = False
+        else:
+            warm = True
+            if age > self.ttl:
+                self.refresh_in_background(self.min_refresh_interval)
+
+        key = self.keys.get(kid)
+        with self.metrics_lock:
+            if key is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if key is None and warm:
+            # the key set may have been rotated: the token is rejected right away, without
+            # waiting for the network, and the next tokens with this kid find the new keys
+            self.refresh_in_background(self.min_refresh_interval)
+        return key
+
+    '''
+    metrics()
+        returns the state of the cached keys and the fetch and lookup counters of this process
+    '''
+    def metrics(self):
+        age = self.age()
+        with self.metrics_lock:
+            return {
+                'keys': len(self.keys),
+                'age_seconds': None if age is None else round(age, 3),
+                'refresher_running': self.refresher is not None and self.refresher.is_alive(),
+                'fetches': self.fetches,
+                'fetch_failures': self.fetch_failures,
+                'fetch_seconds_last': None if self.fetch_seconds_last is None else round(self.fetch_seconds_last, 6),
+                'fetch_seconds_max': round(self.fetch_seconds_max, 6),
+                'fetch_seconds_avg': round(self.fetch_seconds_total / self.fetches, 6) if self.fetches else 0.0,
+                'last_error': self.last_error,
+                'key_hits': self.hits,
+                'key_misses': self.misses
+            }
+
+
+'''
+TokenVerifier(jwks_cache, domain, audience, algorithms, error)
+    verifies the signature and the claims of the Auth0 tokens with the keys of jwks_cache.
+    Failures are raised as error(description dict, status code), the AuthError of the app
+'''
+class TokenVerifier:
+    def __init__(self, jwks_cache, domain, audience, algorithms, error):
+        self.jwks_cache = jwks_cache
+        self.issuer = 'https://' + domain + '/'
+        self.audience = audience
+        self.algorithms = algorithms
+        self.error = error
+
+    '''
+    verify(token)
+        returns the decoded payload of the token
+    '''
+    def verify(self, token):
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except jwt.JWTError:
+            raise self.error({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
+        if 'kid' not in unverified_header:
+            raise self.error({
+                'code': 'invalid_header',
+                'description': 'Authorization malformed.'
+            }, 401)
+
+        try:
+            key = self.jwks_cache.get_key(unverified_header['kid'])
+        except JWKSUnavailable:
+            raise self.error({
+                'code': 'jwks_unavailable',
+                'description': 'Unable to fetch the keys to verify the token.'
+            }, 503)
+        if key is None:
+            raise self.error({
+                'code': 'invalid_header',
+                'description': 'Unable to find the appropriate key.'
+            }, 400)
+
+        rsa_key = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
+        try:
+            return jwt.decode(
+                token,
+                rsa_key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer
+            )
+
+        except jwt.ExpiredSignatureError:
+            raise self.error({
+                'code': 'token_expired',
+                'description': 'Token expired.'
+            }, 401)
+
+        except jwt.JWTClaimsError:
+            raise self.error({
+                'code': 'invalid_claims',
+                'description': 'Incorrect claims. Please, check the audience and issuer.'
+            }, 401)
+        except Exception:
+            raise self.error({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 400)
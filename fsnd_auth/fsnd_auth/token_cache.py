@@ -0,0 +1,74 @@
+'''
+Bounded cache of the payloads of verified tokens.
+
+Clients send the same bearer token on every request, so once its signature and
+claims have been verified the payload is kept, keyed by the SHA-256 of the
+token (the tokens themselves are not kept in memory). An entry expires with
+the token (its `exp` claim) or after max_ttl seconds, whichever comes first,
+which bounds how long a token keeps working after its key has been revoked:
+
+    TOKEN_CACHE_SIZE   tokens kept per process (default 10000, 0 disables the cache)
+    TOKEN_CACHE_TTL    maximum seconds a verified token is kept (default 300)
+'''
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    def __init__(self, max_entries=10000, max_ttl=300, sweep_interval=60):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.sweep_interval = sweep_interval
+        self.swept_at = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    '''
+    get(token)
+        returns what was kept for the token if it has been verified and has not expired, None otherwise
+    '''
+    def get(self, token):
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    '''
+    put(token, value, exp)
+        keeps a value (e.g. the payload) for a verified token until exp.
+        Tokens without exp are not cached
+    '''
+    def put(self, token, value, exp):
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        expires_at = min(exp, time.time() + self.max_ttl)
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            now = time.time()
+            if len(self.entries) > self.max_entries and now - self.swept_at > self.sweep_interval:
+                # expired tokens go first, then the least recently used ones
+                for expired_key in [k for k, (_, expires) in self.entries.items() if expires <= now]:
+                    del self.entries[expired_key]
+                self.swept_at = now
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,9 @@
+from setuptools import setup
+
+# token verification shared by BasicFlaskAuth and the coffee shop backend, which
+# install it in editable mode from their requirements.txt (python-jose comes with them)
+setup(
+    name='fsnd_auth',
+    version='0.1.0',
+    packages=['fsnd_auth']
+)
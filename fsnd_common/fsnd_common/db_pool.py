@@ -0,0 +1,129 @@
+'''
+Connection pool settings and metrics of the Flask apps of the repository (Fyyur,
+the trivia API and the coffee shop backend).
+
+The pool options of the SQLAlchemy engine are read from environment
+variables, so every deployment can size its pool for its number of workers
+(each worker process has its own pool):
+
+    DB_POOL_SIZE          connections kept open per process (default 5)
+    DB_MAX_OVERFLOW       extra connections opened under load (default 10)
+    DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE       seconds after which a connection is replaced (default 1800)
+    DB_POOL_PRE_PING      test connections before handing them out (default true)
+    DB_STATEMENT_TIMEOUT  milliseconds before PostgreSQL cancels a statement (default 0, no limit)
+
+SQLite databases only use the pre-ping and recycle options.
+'''
+
+import os
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+'''
+MeteredQueuePool
+    QueuePool that records how many checkouts had to wait for a connection and for how long
+'''
+class MeteredQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    # connect() runs once per checkout (QueuePool._do_get retries by calling itself):
+    # the time includes the wait for a free connection, opening it and the pre-ping
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            with self.metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self.metrics_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+'''
+engine_options(database_path)
+    returns the SQLALCHEMY_ENGINE_OPTIONS for the database, from the environment
+'''
+def engine_options(database_path):
+    options = {
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800)
+    }
+    if database_path.startswith('sqlite'):
+        return options
+
+    options.update({
+        'poolclass': MeteredQueuePool,
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30)
+    })
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT', 0)
+    if statement_timeout and database_path.startswith('postgres'):
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(statement_timeout)}
+    return options
+
+
+'''
+pool_metrics(engine, options)
+    returns the state of the connection pool of the engine, created with options (engine_options())
+'''
+def pool_metrics(engine, options):
+    pool = engine.pool
+    metrics = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(0, pool.overflow()),
+            'max_overflow': options.get('max_overflow')
+        })
+    if isinstance(pool, MeteredQueuePool):
+        with pool.metrics_lock:
+            metrics.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'wait_seconds_total': round(pool.wait_seconds_total, 6),
+                'wait_seconds_max': round(pool.wait_seconds_max, 6),
+                'wait_seconds_avg': round(pool.wait_seconds_total / pool.checkouts, 6) if pool.checkouts else 0.0
+            })
+    return metrics
+
+
+'''
+register_pool_metrics(app, db)
+    adds the GET /metrics endpoint, which reports the pool state of this process
+'''
+def register_pool_metrics(app, db):
+    @app.route('/metrics')
+    def get_pool_metrics():
+        return jsonify({
+            'success': True,
+            'pid': os.getpid(),
+            'database': pool_metrics(db.engine, app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        })
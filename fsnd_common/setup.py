@@ -0,0 +1,9 @@
+from setuptools import setup
+
+# modules shared by Fyyur, the trivia API and the coffee shop backend, which install
+# it in editable mode from their requirements.txt (Flask and SQLAlchemy come with them)
+setup(
+    name='fsnd_common',
+    version='0.1.0',
+    packages=['fsnd_common']
+)
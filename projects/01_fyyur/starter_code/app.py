@@ -3,20 +3,27 @@
 #----------------------------------------------------------------------------#
 
 import json
+import click
 import dateutil.parser
 import babel
 import sys
+from babel import Locale
+from babel.dates import parse_pattern, format_datetime as babel_format_datetime
+from functools import lru_cache
 from flask import Flask, render_template, request, Response, flash, redirect
 from flask import url_for, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from sqlalchemy import distinct, text
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from cache import create_page_cache, venue_key, artist_key
+from bulk_import import import_file
+from fsnd_common.db_pool import register_pool_metrics
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -27,6 +34,11 @@ moment = Moment(app)
 app.config.from_object('config')
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+page_cache = create_page_cache(app.config)
+register_pool_metrics(app, db)
+
+SEARCH_RESULTS_PER_PAGE = 10
+SHOWS_PER_PAGE = 30
 
 # connect to a local postgresql database - DONE in config.py
 
@@ -37,6 +49,10 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name',
+          postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120))
@@ -50,11 +66,18 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120), nullable=True)
     seeking_talent = db.Column(db.Boolean, default=False, nullable=True)
     seeking_description = db.Column(db.String(), nullable=True)
+    # maintained by adjust_show_counters() and refresh_show_counters()
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     shows = db.relationship('Show', back_populates="venue")
 
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name',
+          postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -67,15 +90,23 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120), nullable=True)
     seeking_venue = db.Column(db.Boolean, default=False, nullable=True)
     seeking_description = db.Column(db.String(500), nullable=True)
+    # maintained by adjust_show_counters() and refresh_show_counters()
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     shows = db.relationship('Show', back_populates="artist")
 
 
 class Show(db.Model):
   __tablename__ = 'show'
+  __table_args__ = (
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
-  start_time = db.Column(db.String(), nullable=False)
+  start_time = db.Column(db.DateTime(timezone=True), nullable=False)
   artist = db.relationship("Artist", back_populates="shows")
   venue = db.relationship("Venue", back_populates="shows")
 
@@ -88,13 +119,41 @@ class Show(db.Model):
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+
+# babel named formats, which combine a date and a time format of the locale
+BABEL_NAMED_FORMATS = ('full', 'long', 'medium', 'short')
+
+
+# the babel pattern and locale of every (format, locale) pair are parsed only once.
+# Named formats without a pattern of ours have no single pattern: None
+@lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+  if format not in DATETIME_FORMATS and format in BABEL_NAMED_FORMATS:
+    return None, Locale.parse(locale)
+  return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+
+# accepts datetime objects (as stored in the db) or strings, which are parsed.
+# The same show dates are rendered again and again, so the output is memoized
+def format_datetime(value, format='medium', locale='en'):
+  # aware datetimes of the same instant compare equal whatever their zone,
+  # so the zone they are rendered in is part of the key
+  tzinfo = value.tzinfo if isinstance(value, datetime) else None
+  return formatted_datetime(value, tzinfo, format, locale)
+
+
+@lru_cache(maxsize=4096)
+def formatted_datetime(value, tzinfo, format, locale):
+  date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
+  pattern, babel_locale = datetime_pattern(format, locale)
+  if pattern is None:
+    return babel_format_datetime(date, format, locale=babel_locale)
+  return pattern.apply(date, babel_locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -108,40 +167,233 @@ def index():
   return render_template('pages/home.html')
 
 
+#  Projection helpers
+#  ----------------------------------------------------------------
+
+# the columns rendered by a list page, labelled with the names its template uses.
+# Queries on them return lightweight rows (tuples with attribute access) that are
+# handed to the template as they are: no entity is built nor added to the identity map
+def projection(**columns):
+  return [column.label(name) for name, column in columns.items()]
+
+
+# the columns of a venue or an artist (model) shown by the lists and the search pages
+def list_item(model):
+  return projection(id=model.id, name=model.name, num_upcoming_shows=model.upcoming_shows_count)
+
+
+#  Shows helpers
+#  ----------------------------------------------------------------
+
+# updates the show counters of the venue and the artist of a show that is being created
+# (delta=1) or deleted (delta=-1), in the same transaction as the show itself
+def adjust_show_counters(venue_id, artist_id, start_time, delta):
+  if start_time > datetime.now(start_time.tzinfo):
+    counters = 'upcoming_shows_count'
+  else:
+    counters = 'past_shows_count'
+
+  Venue.query.filter_by(id=venue_id) \
+    .update({counters: getattr(Venue, counters) + delta}, synchronize_session=False)
+  Artist.query.filter_by(id=artist_id) \
+    .update({counters: getattr(Artist, counters) + delta}, synchronize_session=False)
+
+
+# recounts the upcoming and past shows of the venues or artists (model) with the given ids,
+# or of all of them when ids is None. Every row is counted through its (id, start_time) index
+def refresh_show_counters(model, show_foreign_key, ids=None):
+  upcoming_shows = db.select([db.func.count(Show.id)]) \
+    .where(show_foreign_key == model.id) \
+    .where(Show.start_time > db.func.now()) \
+    .as_scalar()
+  past_shows = db.select([db.func.count(Show.id)]) \
+    .where(show_foreign_key == model.id) \
+    .where(Show.start_time <= db.func.now()) \
+    .as_scalar()
+
+  query = model.query
+  if ids is not None:
+    query = query.filter(model.id.in_(ids))
+  return query.update({
+    model.upcoming_shows_count: upcoming_shows,
+    model.past_shows_count: past_shows
+  }, synchronize_session=False)
+
+
+# restricts a query on shows to the upcoming or to the past ones
+def filter_upcoming(query, upcoming):
+  if upcoming:
+    return query.filter(Show.start_time > db.func.now())
+  return query.filter(Show.start_time <= db.func.now())
+
+
+# returns the upcoming or past shows of a venue with the artist information the venue page needs
+def shows_of_venue(venue_id, upcoming):
+  query = db.session.query(Show.artist_id, Artist.name, Artist.image_link, Show.start_time) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.venue_id == venue_id)
+  shows = filter_upcoming(query, upcoming).order_by(Show.start_time).all()
+
+  return [{
+    'artist_id': artist_id,
+    'artist_name': artist_name,
+    'artist_image_link': artist_image_link,
+    'start_time': start_time
+  } for artist_id, artist_name, artist_image_link, start_time in shows]
+
+
+# returns the upcoming or past shows of an artist with the venue information the artist page needs
+def shows_of_artist(artist_id, upcoming):
+  query = db.session.query(Show.venue_id, Venue.name, Venue.image_link, Show.start_time) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .filter(Show.artist_id == artist_id)
+  shows = filter_upcoming(query, upcoming).order_by(Show.start_time).all()
+
+  return [{
+    'venue_id': venue_id,
+    'venue_name': venue_name,
+    'venue_image_link': venue_image_link,
+    'start_time': start_time
+  } for venue_id, venue_name, venue_image_link, start_time in shows]
+
+
+# cursors of the /shows keyset pagination identify a show by its (start_time, id) key
+def show_cursor(start_time, show_id):
+  return start_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ') + '_' + str(show_id)
+
+
+def parse_show_cursor(cursor):
+  start_time, show_id = cursor.rsplit('_', 1)
+  start_time = datetime.strptime(start_time, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+  return start_time, int(show_id)
+
+
+# returns a page of shows ordered by (start_time, id), with the venue and artist
+# information obtained in the same query. The page starts right after (or ends right
+# before) the given cursor key, so its cost does not depend on how many shows come first
+def shows_page(after=None, before=None):
+  query = db.session.query(Show.id, Show.start_time, Show.venue_id, Venue.name,
+      Show.artist_id, Artist.name, Artist.image_link) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id)
+  key = db.tuple_(Show.start_time, Show.id)
+
+  if before is not None:
+    rows = query.filter(key < db.tuple_(*before)) \
+      .order_by(Show.start_time.desc(), Show.id.desc()) \
+      .limit(SHOWS_PER_PAGE + 1) \
+      .all()
+    has_previous = len(rows) > SHOWS_PER_PAGE
+    has_next = True
+    rows = rows[:SHOWS_PER_PAGE][::-1]
+  else:
+    if after is not None:
+      query = query.filter(key > db.tuple_(*after))
+    rows = query.order_by(Show.start_time, Show.id) \
+      .limit(SHOWS_PER_PAGE + 1) \
+      .all()
+    has_previous = after is not None
+    has_next = len(rows) > SHOWS_PER_PAGE
+    rows = rows[:SHOWS_PER_PAGE]
+
+  shows = [{
+    "venue_id": venue_id,
+    "venue_name": venue_name,
+    "artist_id": artist_id,
+    "artist_name": artist_name,
+    "artist_image_link": artist_image_link,
+    "start_time": start_time
+  } for show_id, start_time, venue_id, venue_name, artist_id, artist_name, artist_image_link in rows]
+
+  return {
+    "shows": shows,
+    "previous": show_cursor(rows[0][1], rows[0][0]) if rows and has_previous else None,
+    "next": show_cursor(rows[-1][1], rows[-1][0]) if rows and has_next else None
+  }
+
+
+# pages of the artists with shows at the venue, which show the venue name and image
+def artist_keys_of_venue(venue_id):
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return [artist_key(artist_id) for artist_id, in artist_ids]
+
+
+# pages of the venues with shows of the artist, which show the artist name and image
+def venue_keys_of_artist(artist_id):
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return [venue_key(venue_id) for venue_id, in venue_ids]
+
+
+#  Search helpers
+#  ----------------------------------------------------------------
+
+# escapes the LIKE wildcards of the search term so it is matched literally
+def like_pattern(search_term):
+  escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+  return '%' + escaped + '%'
+
+
+# returns a page of the venues or artists (model) whose name contains the search term,
+# together with the total number of matches. ILIKE '%term%' is served by the trigram
+# GIN index on name, results are ranked by similarity and paginated in SQL
+def search_by_name(model, search_term, page):
+  matches = db.session.query(*list_item(model))
+  if search_term:
+    matches = matches.filter(model.name.ilike(like_pattern(search_term)))
+    rank = db.func.similarity(model.name, search_term)
+  else:
+    rank = db.literal(0)
+  count = matches.order_by(None).count()
+
+  rows = matches.order_by(rank.desc(), model.id) \
+    .limit(SEARCH_RESULTS_PER_PAGE) \
+    .offset((page - 1) * SEARCH_RESULTS_PER_PAGE) \
+    .all()
+
+  return rows, count
+
+
+# builds the response expected by the search templates
+def search_response(rows, count, page):
+  return {
+    "count": count,
+    "data": rows,
+    "page": page,
+    "pages": max(1, -(-count // SEARCH_RESULTS_PER_PAGE))
+  }
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
+# returns the venues grouped by area (city and state) together with the number of
+# upcoming shows of every venue. The whole tree is built from a single query,
+# so the number of round trips does not grow with the number of venues
+def venues_by_area():
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count) \
+    .order_by(Venue.city, Venue.state, Venue.id) \
+    .all()
+
+  areas = []
+  for venue_id, name, city, state, upcoming_shows in rows:
+    if not areas or areas[-1]["city"] != city or areas[-1]["state"] != state:
+      areas.append({"city": city, "state": state, "venues": []})
+    areas[-1]["venues"].append({
+      "id": venue_id,
+      "name": name,
+      "num_upcoming_shows": upcoming_shows
+    })
+
+  return areas
+
+
 # returns all the venues grouped by areas
 @app.route('/venues')
 def venues():
   # DONE: replace with real venues data.
   # num_shows should be aggregated based on number of upcoming shows per venue.
 
-  areas = []
-  sql = text('select city, state FROM venue GROUP BY city, state ORDER BY city')
-  result = db.engine.execute(sql)
-  cityAndState = result.fetchone()
-  while cityAndState is not None:
-    currentArea = {}
-    currentArea["city"] = city = cityAndState[0]
-    currentArea["state"] = state = cityAndState[1]
-    
-    venues = []
-    venuesInArea = Venue.query.filter_by(city=city, state=state).all()
-    for venue in venuesInArea:
-      currentVenue = {}
-      currentVenue["id"] = venue.id
-      currentVenue["name"] = venue.name
-      num_upcoming_shows=0
-      for show in venue.shows:
-        if datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S') > datetime.now():
-          num_upcoming_shows = num_upcoming_shows + 1
-      currentVenue["num_upcoming_shows"] = num_upcoming_shows
-      venues.append(currentVenue)
-    
-    currentArea["venues"] = venues
-    areas.append(currentArea)
-    cityAndState = result.fetchone()
+  areas = venues_by_area()
 
   # data=[{
   #   "city": "San Francisco",
@@ -175,26 +427,10 @@ def search_venues():
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
   searchTerm = request.form['search_term']
-  if searchTerm:
-    venues = Venue.query.filter(Venue.name.ilike('%'+searchTerm+'%')).all()
-  else:
-    venues = Venue.query.all()
-
-  response={}
-  response["count"]=len(venues);
-  data = []
-  for venue in venues:
-    currentVenue = {}
-    currentVenue["id"]=venue.id
-    currentVenue["name"]=venue.name
-    num_upcoming_shows=0
-    for show in venue.shows:
-      if datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S') > datetime.now():
-        num_upcoming_shows = num_upcoming_shows + 1
-    currentVenue["num_upcoming_shows"] = num_upcoming_shows
-    data.append(currentVenue)
- 
-  response["data"]=data
+  page = max(1, request.form.get('page', 1, type=int))
+  venues, count = search_by_name(Venue, searchTerm, page)
+
+  response = search_response(venues, count, page)
 
   # response={
   #   "count": 1,
@@ -207,16 +443,13 @@ def search_venues():
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-# Returns the venue with the id indicated in the request
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # DONE: replace with real venue data from the venues table, using venue_id
-
+# builds the data of the venue page, and returns it with the start time of the next
+# upcoming show, when the page will change by itself
+def venue_page_data(venue_id):
   venue = Venue.query.get(venue_id)
-  
+
   if venue is None:
-    return redirect(url_for('venues'))
+    return None, None
 
   data={}
   data["id"]=venue.id
@@ -232,28 +465,28 @@ def show_venue(venue_id):
   data["seeking_description"]=venue.seeking_description
   data["image_link"]=venue.image_link
 
-  upcoming_shows_count=0
-  past_shows_count=0
-  upcoming_shows = []
-  past_shows = []
-  for show in venue.shows:
-    current_show = {}
-    current_show['artist_id'] = show.artist_id
-    current_show['artist_name'] = show.artist.name
-    current_show['artist_image_link'] = show.artist.image_link
-    current_show['start_time'] = show.start_time
-    if datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S') > datetime.now():
-      upcoming_shows_count = upcoming_shows_count + 1
-      upcoming_shows.append(current_show)
-    else:
-      past_shows_count = past_shows_count + 1
-      past_shows.append(current_show)
+  upcoming_shows = shows_of_venue(venue_id, upcoming=True)
+  past_shows = shows_of_venue(venue_id, upcoming=False)
 
-  data["upcoming_shows_count"] = upcoming_shows_count
-  data["past_shows_count"] = past_shows_count
+  data["upcoming_shows_count"] = len(upcoming_shows)
+  data["past_shows_count"] = len(past_shows)
   data["past_shows"] = past_shows
   data["upcoming_shows"] = upcoming_shows
 
+  return data, upcoming_shows[0]['start_time'] if upcoming_shows else None
+
+
+# Returns the venue with the id indicated in the request
+@app.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  # DONE: replace with real venue data from the venues table, using venue_id
+
+  data = page_cache.get_or_build(venue_key(venue_id), lambda: venue_page_data(venue_id))
+
+  if data is None:
+    return redirect(url_for('venues'))
+
   # data1={
   #   "id": 1,
   #   "name": "The Musical Hop",
@@ -372,6 +605,7 @@ def create_venue_submission():
 
     db.session.add(venue)
     db.session.commit()
+    # a new venue has no shows yet, so it does not appear in any cached page
   except:
     error = True
     db.session.rollback()
@@ -401,8 +635,10 @@ def delete_venue(venue_id):
   error = False
   try:
     venue = Venue.query.filter_by(id=venue_id).one_or_none()
+    affected_pages = [venue_key(venue.id)] + artist_keys_of_venue(venue.id)
     db.session.delete(venue)
     db.session.commit()
+    page_cache.invalidate(*affected_pages)
   except:
     error = True
     db.session.rollback()
@@ -432,19 +668,7 @@ def delete_venue(venue_id):
 def artists():
   # DONE: replace with real data returned from querying the database
 
-  artists = Artist.query.all();
-
-  data = []
-  for currentArtist in artists:
-    artist = {}
-    artist["id"]=currentArtist.id
-    artist["name"]=currentArtist.name
-    num_upcoming_shows=0
-    for show in currentArtist.shows:
-      if datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S') > datetime.now():
-        num_upcoming_shows = num_upcoming_shows + 1
-    artist["num_upcoming_shows"] = num_upcoming_shows
-    data.append(artist)
+  data = db.session.query(*list_item(Artist)).all()
 
   # data=[{
   #   "id": 4,
@@ -466,27 +690,10 @@ def search_artists():
   # search for "band" should return "The Wild Sax Band".
 
   searchTerm = request.form['search_term']
-  if searchTerm:
-    artists = Artist.query.filter(Artist.name.ilike('%'+searchTerm+'%')).all()
-  else:
-    artists = Artist.query.all()
+  page = max(1, request.form.get('page', 1, type=int))
+  artists, count = search_by_name(Artist, searchTerm, page)
 
-  response={}
-  response["count"]=len(artists);
-  data = []
-  
-  for artist in artists:
-    currentArtist = {}
-    currentArtist["id"]=artist.id
-    currentArtist["name"]=artist.name
-    num_upcoming_shows=0
-    for show in artist.shows:
-      if datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S') > datetime.now():
-        num_upcoming_shows = num_upcoming_shows + 1
-    currentArtist["num_upcoming_shows"] = num_upcoming_shows
-    data.append(currentArtist)
- 
-  response["data"]=data
+  response = search_response(artists, count, page)
 
   # response={
   #   "count": 1,
@@ -499,14 +706,14 @@ def search_artists():
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-# returns the artist with the id indicated in the route
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # DONE: replace with real venue data from the venues table, using venue_id
-
+# builds the data of the artist page, and returns it with the start time of the next
+# upcoming show, when the page will change by itself
+def artist_page_data(artist_id):
   artist = Artist.query.get(artist_id)
 
+  if artist is None:
+    return None, None
+
   data = {}
   data["id"]=artist.id
   data["name"]=artist.name
@@ -520,28 +727,28 @@ def show_artist(artist_id):
   data["phone"]=artist.phone
   data["image_link"]=artist.image_link
 
-  upcoming_shows_count=0
-  past_shows_count=0
-  upcoming_shows = []
-  past_shows = []
-  for show in artist.shows:
-    current_show = {}
-    current_show['venue_id'] = show.venue_id
-    current_show['venue_name'] = show.venue.name
-    current_show['venue_image_link'] = show.venue.image_link
-    current_show['start_time'] = show.start_time
-    if datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S') > datetime.now():
-      upcoming_shows_count = upcoming_shows_count + 1
-      upcoming_shows.append(current_show)
-    else:
-      past_shows_count = past_shows_count + 1
-      past_shows.append(current_show)
+  upcoming_shows = shows_of_artist(artist_id, upcoming=True)
+  past_shows = shows_of_artist(artist_id, upcoming=False)
 
-  data["upcoming_shows_count"] = upcoming_shows_count
-  data["past_shows_count"] = past_shows_count
+  data["upcoming_shows_count"] = len(upcoming_shows)
+  data["past_shows_count"] = len(past_shows)
   data["past_shows"] = past_shows
   data["upcoming_shows"] = upcoming_shows
 
+  return data, upcoming_shows[0]['start_time'] if upcoming_shows else None
+
+
+# returns the artist with the id indicated in the route
+@app.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+  # shows the venue page with the given venue_id
+  # DONE: replace with real venue data from the venues table, using venue_id
+
+  data = page_cache.get_or_build(artist_key(artist_id), lambda: artist_page_data(artist_id))
+
+  if data is None:
+    abort(404)
+
   # data1={
   #   "id": 4,
   #   "name": "Guns N Petals",
@@ -682,8 +889,10 @@ def edit_artist_submission(artist_id):
     artist.image_link=image_link
     artist.seeking_venue=seeking_venue
     artist.seeking_description=seeking_description
+    affected_pages = [artist_key(artist_id)] + venue_keys_of_artist(artist_id)
 
     db.session.commit()
+    page_cache.invalidate(*affected_pages)
   except:
     error = True
     db.session.rollback()
@@ -768,8 +977,10 @@ def edit_venue_submission(venue_id):
     venue.image_link=image_link
     venue.seeking_talent=seeking_talent
     venue.seeking_description=seeking_description
+    affected_pages = [venue_key(venue_id)] + artist_keys_of_venue(venue_id)
 
     db.session.commit()
+    page_cache.invalidate(*affected_pages)
   except:
     error = True
     db.session.rollback()
@@ -847,25 +1058,33 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-# returns all shows
+# returns a page of shows. The page starts after the cursor given in ?after= or ends
+# before the one given in ?before=. Requests accepting only JSON (the infinite scroll
+# of the shows page) receive the page as JSON instead of the rendered template
 @app.route('/shows')
 def shows():
   # displays list of shows at /shows
   # DONE: replace with real venues data.
   # num_shows should be aggregated based on number of upcoming shows per venue.
 
-  shows = Show.query.all();
+  try:
+    after = request.args.get('after')
+    before = request.args.get('before')
+    page = shows_page(after=parse_show_cursor(after) if after else None,
+      before=parse_show_cursor(before) if before else None)
+  except ValueError:
+    abort(400)
+
+  if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
+    return jsonify({
+      'shows': [dict(show,
+        start_time=show['start_time'].isoformat(),
+        start_time_formatted=format_datetime(show['start_time'], 'full')) for show in page['shows']],
+      'previous': page['previous'],
+      'next': page['next']
+    })
 
-  data = []
-  for show in shows:
-    currentShow = {}
-    currentShow["venue_id"]=show.venue_id
-    currentShow["venue_name"]=show.venue.name
-    currentShow["artist_id"]=show.artist_id
-    currentShow["artist_name"]=show.artist.name
-    currentShow["artist_image_link"]=show.artist.image_link
-    currentShow["start_time"]=show.start_time
-    data.append(currentShow)
+  data = page['shows']
 
   # data=[{
   #   "venue_id": 1,
@@ -903,7 +1122,7 @@ def shows():
   #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
   #   "start_time": "2035-04-15T20:00:00.000Z"
   # }]
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data, previous=page['previous'], next=page['next'])
 
 
 # shows the form to create a new show
@@ -922,7 +1141,7 @@ def create_show_submission():
 
   artist_id = request.form["artist_id"]
   venue_id = request.form["venue_id"]
-  start_time = request.form["start_time"]
+  start_time = dateutil.parser.parse(request.form["start_time"])
   artist = Artist.query.get(artist_id)
   venue = Venue.query.get(venue_id)
 
@@ -932,7 +1151,9 @@ def create_show_submission():
   else:
     show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time, artist=artist, venue=venue)
     db.session.add(show)
+    adjust_show_counters(venue.id, artist.id, start_time, 1)
     db.session.commit()
+    page_cache.invalidate(venue_key(venue.id), artist_key(artist.id))
     flash('Show was created succesfully!')
 
   # on successful db insert, flash success
@@ -942,6 +1163,116 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+# periodic job (e.g. run by cron every few minutes) that moves the shows that have started
+# during the last <window> seconds from the upcoming to the past counters of their venues
+# and artists. Counters are recounted, not decremented, so overlapping windows are harmless
+@app.cli.command('roll-shows')
+@click.option('--window', default=3600, help='Seconds to look back for started shows, longer than the job interval.')
+@click.option('--all', 'refresh_all', is_flag=True, help='Recount the counters of every venue and artist.')
+def roll_shows(window, refresh_all):
+  if refresh_all:
+    venue_ids = artist_ids = None
+  else:
+    since = datetime.now(timezone.utc) - timedelta(seconds=window)
+    started = db.session.query(Show.venue_id, Show.artist_id) \
+      .filter(Show.start_time > since) \
+      .filter(Show.start_time <= db.func.now()) \
+      .all()
+    venue_ids = {venue_id for venue_id, artist_id in started}
+    artist_ids = {artist_id for venue_id, artist_id in started}
+
+  venues = refresh_show_counters(Venue, Show.venue_id, venue_ids)
+  artists = refresh_show_counters(Artist, Show.artist_id, artist_ids)
+  db.session.commit()
+  click.echo('Show counters refreshed for {} venues and {} artists'.format(venues, artists))
+
+
+VENUE_COLUMNS = ('name', 'city', 'state', 'address', 'phone', 'genres', 'website', 'image_link',
+  'facebook_link', 'seeking_talent', 'seeking_description')
+ARTIST_COLUMNS = ('name', 'city', 'state', 'phone', 'genres', 'website', 'image_link',
+  'facebook_link', 'seeking_venue', 'seeking_description')
+
+
+def show_record(form):
+  artist_id = form.artist_id.data.strip()
+  venue_id = form.venue_id.data.strip()
+  return {
+    'artist_id': int(artist_id) if artist_id.isdigit() else None,
+    'venue_id': int(venue_id) if venue_id.isdigit() else None,
+    'start_time': form.start_time.data
+  }
+
+
+# rejects the shows of a batch whose artist or venue does not exist, checked with one query each
+def check_show_references(records):
+  artist_ids = {record['artist_id'] for record in records}
+  venue_ids = {record['venue_id'] for record in records}
+  known_artists = {artist_id for artist_id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+  known_venues = {venue_id for venue_id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+
+  valid_records = []
+  errors = []
+  for index, record in enumerate(records):
+    if record['artist_id'] not in known_artists:
+      errors.append((index, 'artist_id: there is no artist with this id'))
+    elif record['venue_id'] not in known_venues:
+      errors.append((index, 'venue_id: there is no venue with this id'))
+    else:
+      valid_records.append(record)
+  return valid_records, errors
+
+
+# recounts the counters of the venues and artists of the imported shows, in the
+# transaction of the batch
+def after_show_batch(records):
+  refresh_show_counters(Venue, Show.venue_id, {record['venue_id'] for record in records})
+  refresh_show_counters(Artist, Show.artist_id, {record['artist_id'] for record in records})
+
+
+# drops the pages of the venues and artists of the imported shows. It runs once the
+# batch is committed, so that no request caches a page built from the data before it
+def invalidate_show_pages(records):
+  page_cache.invalidate(*[venue_key(venue_id) for venue_id in {record['venue_id'] for record in records}],
+    *[artist_key(artist_id) for artist_id in {record['artist_id'] for record in records}])
+
+
+# imports venues, artists or shows from a CSV (with a header line) or a JSONL file.
+# Rows are validated with the forms of the site and written in batches, one transaction
+# per batch. With --checkpoint, a new run with the same file resumes after the last batch
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, help='Rows written per transaction.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), help='File where the progress is saved to resume the import.')
+def import_data(kind, path, batch_size, checkpoint):
+  if kind == 'venues':
+    options = dict(table=Venue.__table__, form_class=VenueForm, multiple_value_fields=('genres',),
+      to_record=lambda form: {column: form[column].data for column in VENUE_COLUMNS})
+  elif kind == 'artists':
+    options = dict(table=Artist.__table__, form_class=ArtistForm, multiple_value_fields=('genres',),
+      to_record=lambda form: {column: form[column].data for column in ARTIST_COLUMNS})
+  else:
+    options = dict(table=Show.__table__, form_class=ShowForm, to_record=show_record,
+      required_fields=('start_time',), check_batch=check_show_references, after_batch=after_show_batch)
+
+  def on_error(line_number, messages):
+    click.echo('line {}: {}'.format(line_number, '; '.join(messages)), err=True)
+
+  def on_batch(report, records):
+    if kind == 'shows':
+      invalidate_show_pages(records)
+    click.echo(str(report))
+
+  try:
+    report = import_file(db.session, path=path, batch_size=batch_size, checkpoint_path=checkpoint,
+      on_error=on_error, on_batch=on_batch, **options)
+  except Exception as error:
+    db.session.rollback()
+    raise click.ClickException('batch failed, nothing was written after the last checkpoint: ' + str(error))
+
+  click.echo('Import finished: ' + str(report))
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
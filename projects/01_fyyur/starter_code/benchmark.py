@@ -0,0 +1,196 @@
+'''
+Benchmarks for the Fyyur data paths.
+
+They run against the database configured in config.py, so point it to a
+scratch database first. Every benchmark removes the rows it inserts.
+
+Usage:
+    python benchmark.py venues
+    python benchmark.py datetime_filter
+    python benchmark.py artists
+'''
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import babel.dates
+import dateutil.parser
+from sqlalchemy import event
+
+from app import app, db, Venue, Artist, Show, format_datetime, formatted_datetime, list_item
+
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+# counts the statements sent to the database while the block is running
+@contextmanager
+def count_queries():
+  counter = {"queries": 0}
+
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter["queries"] += 1
+
+  event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+  try:
+    yield counter
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+# inserts <num_venues> venues spread over a few areas, each one with a past and
+# an upcoming show, and returns the ids needed to remove them afterwards
+def seed_venues(num_venues):
+  artist = Artist(name='Benchmark Artist', genres=['Jazz'], city='Benchville',
+    state='CA', phone='000-000-0000')
+  db.session.add(artist)
+  db.session.flush()
+
+  venues = [Venue(name='Benchmark Venue ' + str(i), genres=['Jazz'],
+    city='Benchville ' + str(i % 10), state='CA', address='1 Bench Street',
+    phone='000-000-0000') for i in range(num_venues)]
+  db.session.add_all(venues)
+  db.session.flush()
+
+  shows = []
+  for venue in venues:
+    shows.append(Show(artist_id=artist.id, venue_id=venue.id, start_time=datetime(2019, 1, 1, 20)))
+    shows.append(Show(artist_id=artist.id, venue_id=venue.id, start_time=datetime(2035, 1, 1, 20)))
+  db.session.add_all(shows)
+  db.session.commit()
+
+  return artist.id, [venue.id for venue in venues]
+
+
+def remove_seed(artist_id, venue_ids):
+  Show.query.filter(Show.artist_id == artist_id).delete(synchronize_session=False)
+  Venue.query.filter(Venue.id.in_(venue_ids)).delete(synchronize_session=False)
+  Artist.query.filter(Artist.id == artist_id).delete(synchronize_session=False)
+  db.session.commit()
+
+
+# runs function once and returns its duration in ms and the peak of the memory
+# it allocated in KiB
+def measure(function):
+  tracemalloc.start()
+  start = time.perf_counter()
+  function()
+  elapsed = (time.perf_counter() - start) * 1000
+  peak = tracemalloc.get_traced_memory()[1] / 1024
+  tracemalloc.stop()
+  return elapsed, peak
+
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#----------------------------------------------------------------------------#
+
+# renders /venues with a growing number of venues. The number of queries must
+# stay the same whatever the size of the catalog
+def benchmark_venues(sizes=(10, 100, 1000, 4000)):
+  client = app.test_client()
+  print('{:>8} {:>8} {:>10}'.format('venues', 'queries', 'ms'))
+
+  query_counts = []
+  for size in sizes:
+    with app.app_context():
+      artist_id, venue_ids = seed_venues(size)
+    try:
+      with app.app_context(), count_queries() as counter:
+        start = time.perf_counter()
+        response = client.get('/venues')
+        elapsed = (time.perf_counter() - start) * 1000
+      assert response.status_code == 200
+      query_counts.append(counter["queries"])
+      print('{:>8} {:>8} {:>10.1f}'.format(size, counter["queries"], elapsed))
+    finally:
+      with app.app_context():
+        remove_seed(artist_id, venue_ids)
+
+  if len(set(query_counts)) != 1:
+    sys.exit('the number of queries of /venues grows with the number of venues')
+
+
+# the datetime filter as it was before the babel patterns and the output were cached
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+# formats 10k timestamps with the legacy filter and with the current one. Pages show
+# the same dates many times, so besides 10k distinct dates the benchmark also formats
+# 10k dates taken from 500 distinct shows
+def benchmark_datetime_filter(size=10000, distinct_shows=500):
+  first = datetime(2020, 1, 1, 20, tzinfo=timezone.utc)
+  distinct = [first + timedelta(hours=i) for i in range(size)]
+  repeated = [distinct[i % distinct_shows] for i in range(size)]
+
+  cases = [
+    ('legacy, distinct', legacy_format_datetime, [str(date) for date in distinct]),
+    ('legacy, repeated', legacy_format_datetime, [str(date) for date in repeated]),
+    ('cached, distinct', format_datetime, distinct),
+    ('cached, repeated', format_datetime, repeated),
+  ]
+
+  print('{:<18} {:>10} {:>12}'.format('filter', 'ms', 'us/value'))
+  for name, filter_function, values in cases:
+    formatted_datetime.cache_clear()
+    start = time.perf_counter()
+    for value in values:
+      filter_function(value, 'full')
+    elapsed = time.perf_counter() - start
+    print('{:<18} {:>10.1f} {:>12.2f}'.format(name, elapsed * 1000, elapsed * 1e6 / len(values)))
+
+
+# loads the rows of /artists as full Artist entities (what the page did before its
+# query was projected) and as the columns it renders, with a growing number of artists
+def benchmark_artists(sizes=(1000, 10000, 50000)):
+  def entities():
+    db.session.expunge_all()
+    return [{"id": artist.id, "name": artist.name, "num_upcoming_shows": artist.upcoming_shows_count}
+      for artist in Artist.query.all()]
+
+  def projected():
+    db.session.expunge_all()
+    return db.session.query(*list_item(Artist)).all()
+
+  print('{:>8} {:>12} {:>12} {:>14} {:>14}'.format('artists', 'entities ms', 'columns ms',
+    'entities KiB', 'columns KiB'))
+  for size in sizes:
+    with app.app_context():
+      artists = [{'name': 'Benchmark Artist ' + str(i), 'genres': ['Jazz'], 'city': 'Benchville',
+        'state': 'CA', 'phone': '000-000-0000'} for i in range(size)]
+      db.session.execute(Artist.__table__.insert(), artists)
+      db.session.commit()
+      try:
+        # warm up the connection and the compiled statements
+        entities(), projected()
+        entities_ms, entities_kib = measure(entities)
+        columns_ms, columns_kib = measure(projected)
+        print('{:>8} {:>12.1f} {:>12.1f} {:>14.0f} {:>14.0f}'.format(size, entities_ms, columns_ms,
+          entities_kib, columns_kib))
+      finally:
+        Artist.query.filter(Artist.name.like('Benchmark Artist %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+BENCHMARKS = {
+  'venues': benchmark_venues,
+  'datetime_filter': benchmark_datetime_filter,
+  'artists': benchmark_artists,
+}
+
+
+if __name__ == '__main__':
+  names = sys.argv[1:] or list(BENCHMARKS)
+  for name in names:
+    print('== ' + name)
+    BENCHMARKS[name]()
@@ -0,0 +1,177 @@
+'''
+Bulk import of venues, artists and shows from CSV or JSONL files.
+
+Rows are streamed from the file, validated with the forms used by the site
+(forms.py) and written in batches with a single executemany per batch, each
+batch in its own transaction. After every batch the checkpoint file (if any)
+records how many rows of the file have been processed, so an interrupted
+import resumes right after the last committed batch.
+'''
+
+import csv
+import json
+import os
+import time
+
+from werkzeug.datastructures import MultiDict
+
+
+# yields (line number, row, error) for every row of a CSV file (with a header line)
+# or of a JSONL file (one JSON object per line). error is set for unreadable rows
+def read_rows(path):
+  with open(path, newline='', encoding='utf-8') as rows_file:
+    if path.endswith('.csv'):
+      reader = csv.DictReader(rows_file)
+      for row in reader:
+        yield reader.line_num, row, None
+    else:
+      for line_number, line in enumerate(rows_file, start=1):
+        if not line.strip():
+          continue
+        try:
+          row = json.loads(line)
+        except ValueError as error:
+          yield line_number, None, 'invalid JSON: ' + str(error)
+          continue
+        if not isinstance(row, dict):
+          yield line_number, None, 'a JSON object is expected'
+        else:
+          yield line_number, row, None
+
+
+# converts a row to the form data the site would post. Lists (JSONL) and comma
+# separated values (CSV) become multiple values, booleans are only sent when true
+def to_formdata(row):
+  formdata = MultiDict()
+  for field, value in row.items():
+    if isinstance(value, list):
+      for item in value:
+        formdata.add(field, str(item))
+    elif isinstance(value, bool):
+      if value:
+        formdata.add(field, 'y')
+    elif value is not None:
+      formdata.add(field, str(value))
+  return formdata
+
+
+# validates a row with the form class, returns the form or the list of errors.
+# required_fields must be set in the row itself: a form default (e.g. the start_time
+# of ShowForm, evaluated at import time) would otherwise satisfy DataRequired
+def validate_row(form_class, row, multiple_value_fields, required_fields=()):
+  missing = [field for field in required_fields if row.get(field) is None or not str(row[field]).strip()]
+  if missing:
+    return None, ['{}: This field is required.'.format(field) for field in missing]
+
+  row = dict(row)
+  for field in multiple_value_fields:
+    if isinstance(row.get(field), str):
+      row[field] = [item.strip() for item in row[field].split(',') if item.strip()]
+  for field in ('seeking_talent', 'seeking_venue'):
+    if isinstance(row.get(field), str):
+      row[field] = row[field].strip().lower() in ('1', 'y', 'yes', 'true')
+
+  form = form_class(formdata=to_formdata(row), meta={'csrf': False})
+  if form.validate():
+    return form, None
+  return None, ['{}: {}'.format(field, ' '.join(messages)) for field, messages in form.errors.items()]
+
+
+class Checkpoint:
+  def __init__(self, path, source):
+    self.path = path
+    self.source = os.path.abspath(source)
+
+  # number of rows of the source already processed by a previous run
+  def load(self):
+    if self.path is None or not os.path.exists(self.path):
+      return 0
+    with open(self.path) as checkpoint_file:
+      state = json.load(checkpoint_file)
+    return state['rows'] if state.get('source') == self.source else 0
+
+  def save(self, rows):
+    if self.path is None:
+      return
+    temporary_path = self.path + '.tmp'
+    with open(temporary_path, 'w') as checkpoint_file:
+      json.dump({'source': self.source, 'rows': rows}, checkpoint_file)
+    os.replace(temporary_path, self.path)
+
+
+class ImportReport:
+  def __init__(self, skipped):
+    self.skipped = skipped
+    self.read = 0
+    self.imported = 0
+    self.rejected = 0
+    self.started = time.perf_counter()
+
+  @property
+  def seconds(self):
+    return time.perf_counter() - self.started
+
+  @property
+  def rows_per_second(self):
+    return self.read / self.seconds if self.seconds else 0.0
+
+  def __str__(self):
+    return '{} rows read ({} skipped from a previous run), {} imported, {} rejected ' \
+      'in {:.1f}s: {:.0f} rows/s'.format(self.read, self.skipped, self.imported,
+      self.rejected, self.seconds, self.rows_per_second)
+
+
+# imports the rows of path into table.
+#   to_record(form) returns the values of the table columns for a valid form.
+#   required_fields are rejected when missing or empty in a row, whatever their form default.
+#   check_batch(records) returns the records that can be written and the errors of
+#     the rest, as (index, message), for checks that need the database (e.g. foreign keys).
+#   after_batch(records) runs in the transaction of the batch once it has been written.
+#   on_error(line_number, messages) and on_batch(report, records) report the progress,
+#     on_batch runs once the batch is committed, with the records written by the batch.
+def import_file(session, table, path, form_class, to_record, batch_size=1000,
+    checkpoint_path=None, multiple_value_fields=(), required_fields=(), check_batch=None,
+    after_batch=None, on_error=None, on_batch=None):
+  checkpoint = Checkpoint(checkpoint_path, path)
+  report = ImportReport(skipped=checkpoint.load())
+  processed = 0
+  batch = []
+
+  def write(batch):
+    records = [record for line_number, record in batch]
+    if check_batch is not None:
+      records, errors = check_batch(records)
+      for index, message in errors:
+        report.rejected += 1
+        if on_error is not None:
+          on_error(batch[index][0], [message])
+    if records:
+      session.execute(table.insert(), records)
+      if after_batch is not None:
+        after_batch(records)
+    session.commit()
+    report.imported += len(records)
+    checkpoint.save(processed)
+    if on_batch is not None:
+      on_batch(report, records)
+
+  for line_number, row, error in read_rows(path):
+    processed += 1
+    if processed <= report.skipped:
+      continue
+    report.read += 1
+
+    form, errors = (None, [error]) if error else validate_row(form_class, row, multiple_value_fields, required_fields)
+    if form is None:
+      report.rejected += 1
+      if on_error is not None:
+        on_error(line_number, errors)
+    else:
+      batch.append((line_number, to_record(form)))
+
+    if len(batch) >= batch_size:
+      write(batch)
+      batch = []
+
+  write(batch)
+  return report
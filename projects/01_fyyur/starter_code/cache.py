@@ -0,0 +1,122 @@
+'''
+Cache for the data of the Fyyur detail pages.
+
+Two backends are available: an in-process LRU (the default) and a Redis
+compatible server, which is shared by all the workers. Redis support needs the
+optional `redis` package.
+
+Entries expire at the end of the current time bucket (buckets are aligned to
+the clock, so every worker expires them at the same moment) or, if sooner, at
+the moment the page changes by itself, i.e. when its next upcoming show
+becomes a past one.
+'''
+
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      value, expires_at = entry
+      if expires_at <= time.time():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, expires_at):
+    with self.lock:
+      self.entries[key] = (value, expires_at)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+
+  def delete(self, *keys):
+    with self.lock:
+      for key in keys:
+        self.entries.pop(key, None)
+
+
+class RedisCache:
+  def __init__(self, url, prefix='fyyur:'):
+    import redis
+
+    self.client = redis.Redis.from_url(url)
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return None if value is None else pickle.loads(value)
+
+  def set(self, key, value, expires_at):
+    ttl = int((expires_at - time.time()) * 1000)
+    if ttl > 0:
+      self.client.set(self.prefix + key, pickle.dumps(value), px=ttl)
+
+  def delete(self, *keys):
+    if keys:
+      self.client.delete(*[self.prefix + key for key in keys])
+
+
+class PageCache:
+  def __init__(self, backend, bucket_seconds=300):
+    self.backend = backend
+    self.bucket_seconds = bucket_seconds
+
+  # end of the current time bucket, or the moment of the next change if it comes sooner
+  def expires_at(self, next_change=None):
+    now = time.time()
+    expires_at = (now // self.bucket_seconds + 1) * self.bucket_seconds
+    if next_change is not None:
+      expires_at = min(expires_at, next_change.timestamp())
+    return expires_at
+
+  # returns the cached value of key, or builds it with build(). build returns the value
+  # and the datetime when it stops being valid (None if it only changes when edited).
+  # Values built as None are not cached
+  def get_or_build(self, key, build):
+    value = self.backend.get(key)
+    if value is None:
+      value, next_change = build()
+      if value is not None:
+        self.backend.set(key, value, self.expires_at(next_change))
+    return value
+
+  # called once a change is committed: a backend failure is logged and does not fail
+  # the request, the stale entries expire at the end of their time bucket
+  def invalidate(self, *keys):
+    try:
+      self.backend.delete(*keys)
+    except Exception:
+      logger.exception('Page cache invalidation failed, %s expire with their bucket', ', '.join(keys))
+
+
+# creates the page cache described by the CACHE_* settings of the app config
+def create_page_cache(config):
+  if config.get('CACHE_TYPE', 'lru') == 'redis':
+    backend = RedisCache(config['CACHE_REDIS_URL'])
+  else:
+    backend = LRUCache(config.get('CACHE_MAX_ENTRIES', 1024))
+  return PageCache(backend, config.get('CACHE_BUCKET_SECONDS', 300))
+
+
+def venue_key(venue_id):
+  return 'venue:' + str(venue_id)
+
+
+def artist_key(artist_id):
+  return 'artist:' + str(artist_id)
@@ -0,0 +1,37 @@
+"""show start_time as timestamp with time zone, indexed by venue and artist
+
+Revision ID: 13b21455914b
+Revises: 641ff8ee3013
+Create Date: 2026-10-18 02:53:49.006951
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '13b21455914b'
+down_revision = '641ff8ee3013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows are converted in place by the USING clause
+    op.alter_column('show', 'start_time',
+               existing_type=sa.VARCHAR(),
+               type_=sa.DateTime(timezone=True),
+               existing_nullable=False,
+               postgresql_using='start_time::timestamp with time zone')
+    op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
+    op.alter_column('show', 'start_time',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.VARCHAR(),
+               existing_nullable=False,
+               postgresql_using="to_char(start_time, 'YYYY-MM-DD HH24:MI:SS')")
@@ -0,0 +1,24 @@
+"""index on show (start_time, id) for the keyset pagination of /shows
+
+Revision ID: 4e59b9235439
+Revises: 9c0e5b7d2a41
+Create Date: 2026-10-18 03:31:42.907114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e59b9235439'
+down_revision = '9c0e5b7d2a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
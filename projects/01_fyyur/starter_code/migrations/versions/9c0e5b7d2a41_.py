@@ -0,0 +1,30 @@
+"""trigram indexes for the venue and artist name searches
+
+Revision ID: 9c0e5b7d2a41
+Revises: 13b21455914b
+Create Date: 2026-10-18 03:12:05.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c0e5b7d2a41'
+down_revision = '13b21455914b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets a GIN index serve ILIKE '%term%' and provides similarity()
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+               postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+               postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
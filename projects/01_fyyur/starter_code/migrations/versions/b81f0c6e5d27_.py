@@ -0,0 +1,47 @@
+"""upcoming and past show counters on venue and artist
+
+Revision ID: b81f0c6e5d27
+Revises: 4e59b9235439
+Create Date: 2026-10-18 04:02:17.551690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f0c6e5d27'
+down_revision = '4e59b9235439'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('artist', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('venue', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill the counters of the existing rows, later kept up to date by the app
+    # and by the `flask roll-shows` job
+    for table, foreign_key in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute('''
+            UPDATE {table} SET
+                upcoming_shows_count = counts.upcoming,
+                past_shows_count = counts.past
+            FROM (
+                SELECT {foreign_key} AS id,
+                    count(*) FILTER (WHERE start_time > now()) AS upcoming,
+                    count(*) FILTER (WHERE start_time <= now()) AS past
+                FROM show
+                GROUP BY {foreign_key}
+            ) AS counts
+            WHERE {table}.id = counts.id
+        '''.format(table=table, foreign_key=foreign_key))
+
+
+def downgrade():
+    op.drop_column('venue', 'upcoming_shows_count')
+    op.drop_column('venue', 'past_shows_count')
+    op.drop_column('artist', 'upcoming_shows_count')
+    op.drop_column('artist', 'past_shows_count')
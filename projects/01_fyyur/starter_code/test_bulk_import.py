@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, create_engine
+from sqlalchemy.orm import Session
+
+from bulk_import import import_file, validate_row
+from forms import ShowForm
+
+
+# the forms only need an application context, the rows are written to a SQLite table
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'test'
+
+metadata = MetaData()
+shows = Table('shows', metadata,
+  Column('id', Integer, primary_key=True),
+  Column('artist_id', Integer),
+  Column('venue_id', Integer),
+  Column('start_time', DateTime))
+
+
+def show_record(form):
+  return {
+    'artist_id': int(form.artist_id.data),
+    'venue_id': int(form.venue_id.data),
+    'start_time': form.start_time.data
+  }
+
+
+class BulkImportTestCase(unittest.TestCase):
+  def setUp(self):
+    self.context = app.app_context()
+    self.context.push()
+    self.engine = create_engine('sqlite://')
+    metadata.create_all(self.engine)
+    self.session = Session(self.engine)
+
+  def tearDown(self):
+    self.session.close()
+    self.context.pop()
+
+  def import_rows(self, rows):
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as rows_file:
+      for row in rows:
+        rows_file.write(json.dumps(row) + '\n')
+    errors = []
+    try:
+      report = import_file(self.session, shows, rows_file.name, ShowForm, show_record,
+        required_fields=('start_time',), on_error=lambda line_number, messages: errors.append(line_number))
+    finally:
+      os.remove(rows_file.name)
+    return report, errors
+
+  # the default start_time of ShowForm should not stand in for a missing one
+  def test_show_without_start_time_is_rejected(self):
+    for row in ({'artist_id': '1', 'venue_id': '1'}, {'artist_id': '1', 'venue_id': '1', 'start_time': ' '}):
+      form, errors = validate_row(ShowForm, row, (), ('start_time',))
+      self.assertIsNone(form)
+      self.assertEqual(errors, ['start_time: This field is required.'])
+
+    form, errors = validate_row(ShowForm, {'artist_id': '1', 'venue_id': '1'}, ())
+    self.assertIsNotNone(form)
+
+  def test_import_skips_shows_without_start_time(self):
+    report, errors = self.import_rows([
+      {'artist_id': 1, 'venue_id': 1, 'start_time': '2035-04-01 20:00:00'},
+      {'artist_id': 1, 'venue_id': 2},
+      {'artist_id': 2, 'venue_id': 1, 'start_time': ''}
+    ])
+
+    self.assertEqual((report.imported, report.rejected), (1, 2))
+    self.assertEqual(errors, [2, 3])
+    start_times = [row.start_time for row in self.session.execute(shows.select())]
+    self.assertEqual([start_time.year for start_time in start_times], [2035])
+
+
+if __name__ == '__main__':
+  unittest.main()
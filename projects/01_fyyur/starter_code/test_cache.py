@@ -0,0 +1,33 @@
+import unittest
+
+from cache import LRUCache, PageCache, venue_key
+
+
+# a backend whose server is down when pages are invalidated
+class UnreachableBackend(LRUCache):
+  def delete(self, *keys):
+    raise ConnectionError('cache server unreachable')
+
+
+class PageCacheTestCase(unittest.TestCase):
+  def test_invalidate_removes_the_pages(self):
+    cache = PageCache(LRUCache())
+    cache.get_or_build(venue_key(1), lambda: ({'name': 'before'}, None))
+
+    cache.invalidate(venue_key(1))
+
+    self.assertEqual(cache.get_or_build(venue_key(1), lambda: ({'name': 'after'}, None)), {'name': 'after'})
+
+  # the change is committed when the pages are invalidated: a failure is only logged
+  def test_failed_invalidation_is_logged(self):
+    cache = PageCache(UnreachableBackend())
+    cache.get_or_build(venue_key(1), lambda: ({'name': 'before'}, None))
+
+    with self.assertLogs('cache', level='ERROR') as logs:
+      cache.invalidate(venue_key(1))
+
+    self.assertIn('venue:1', logs.output[0])
+
+
+if __name__ == '__main__':
+  unittest.main()
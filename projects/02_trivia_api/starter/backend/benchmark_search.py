@@ -0,0 +1,113 @@
+'''
+Benchmark of /search on a large generated dataset.
+
+Restore trivia.psql in a scratch database, then run:
+
+    createdb trivia_benchmark
+    psql trivia_benchmark < trivia.psql
+    python benchmark_search.py [rows] [--keep]
+
+The benchmark generates `rows` questions (default 1000000) from the words of
+the questions of trivia.psql, creates the full text search index, and times
+the former substring search against the full text search of /search. The
+generated questions are removed at the end unless --keep is given.
+'''
+
+import os
+import sys
+import time
+
+from sqlalchemy import text
+
+from flaskr import create_app
+from models import setup_db, db, Question
+
+database_path = os.environ.get('TRIVIA_BENCHMARK_DATABASE',
+  "postgres://{}:{}@{}/{}".format('postgres','EresTonto','localhost:5432', 'trivia_benchmark'))
+
+SEARCH_TERMS = ['title', 'Tom Hanks', 'country world', '"original name"', 'the']
+BATCH_SIZE = 100000
+REPEAT = 5
+
+
+# random questions and answers made of the words of the existing questions
+GENERATE_QUESTIONS = text('''
+  INSERT INTO questions (question, answer, difficulty, category)
+  SELECT
+    (SELECT string_agg(words[1 + floor(random() * array_length(words, 1))::int], ' ')
+     FROM generate_series(1, 8 + g % 8)) || '?',
+    (SELECT string_agg(words[1 + floor(random() * array_length(words, 1))::int], ' ')
+     FROM generate_series(1, 1 + g % 3)),
+    1 + g % 5,
+    1 + g % 6
+  FROM generate_series(1, :rows) AS g,
+    (SELECT array_agg(DISTINCT word) AS words
+     FROM questions, regexp_split_to_table(question || ' ' || answer, '[^A-Za-z0-9]+') AS word
+     WHERE word <> '') AS vocabulary
+''')
+
+
+def create_search_index():
+  path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '001_questions_search_index.sql')
+  with open(path) as migration:
+    statement = migration.read()
+  # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+  with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+    connection.execute(text(statement))
+    connection.execute(text('ANALYZE questions'))
+
+
+def generate_questions(rows):
+  for generated in range(0, rows, BATCH_SIZE):
+    batch = min(BATCH_SIZE, rows - generated)
+    db.session.execute(GENERATE_QUESTIONS, {'rows': batch})
+    db.session.commit()
+    print('{:>10} questions generated'.format(generated + batch))
+
+
+# the search as it was before the full text index: substring match on the question,
+# every match loaded and formatted, the page sliced in Python
+def legacy_search(search_term):
+  questions = Question.query.filter(Question.question.ilike('%'+search_term+'%')).all()
+  return [question.format() for question in questions][:10], len(questions)
+
+
+def timed(function):
+  elapsed = []
+  for _ in range(REPEAT):
+    start = time.perf_counter()
+    result = function()
+    elapsed.append(time.perf_counter() - start)
+  return result, min(elapsed) * 1000
+
+
+def benchmark(app):
+  client = app.test_client()
+  print('{:<18} {:>10} {:>12} {:>10} {:>12}'.format('term', 'substring', 'ms', 'full text', 'ms'))
+  for search_term in SEARCH_TERMS:
+    with app.app_context():
+      (_, legacy_total), legacy_ms = timed(lambda: legacy_search(search_term))
+    response, search_ms = timed(lambda: client.post('/search', json={'searchTerm': search_term}))
+    total = response.get_json().get('total_questions', 0)
+    print('{:<18} {:>10} {:>12.1f} {:>10} {:>12.1f}'.format(search_term, legacy_total, legacy_ms, total, search_ms))
+
+
+if __name__ == '__main__':
+  arguments = [argument for argument in sys.argv[1:] if argument != '--keep']
+  rows = int(arguments[0]) if arguments else 1000000
+
+  app = create_app()
+  setup_db(app, database_path)
+
+  with app.app_context():
+    last_id = db.session.query(db.func.max(Question.id)).scalar() or 0
+    generate_questions(rows)
+    create_search_index()
+
+  try:
+    benchmark(app)
+  finally:
+    if '--keep' not in sys.argv:
+      with app.app_context():
+        Question.query.filter(Question.id > last_id).delete(synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,92 @@
+'''
+Benchmark of the serialization of question listings, on 10k questions.
+
+It uses the same scratch database as benchmark_search.py and generates the
+questions it needs (removed at the end). A listing of `rows` questions is
+serialized as the endpoints did before (ORM entities, Question.format(),
+jsonify) and as they do now (column tuples, RowEncoder, json_response, which
+uses orjson when it is installed). The category map is loaded from entities
+and from (id, type) rows. The time and the peak memory (tracemalloc) of both
+ways are printed:
+
+    python benchmark_serialization.py [rows]
+'''
+
+import sys
+import time
+import tracemalloc
+
+from flask import jsonify
+
+from benchmark_search import GENERATE_QUESTIONS, database_path
+from flaskr import create_app, QUESTION_COLUMNS, question_encoder
+from fsnd_common.serializer import json_response, orjson
+from models import setup_db, db, Question, Category
+
+REPEAT = 5
+
+
+def timed(function):
+  elapsed = []
+  for _ in range(REPEAT):
+    start = time.perf_counter()
+    function()
+    elapsed.append(time.perf_counter() - start)
+  return min(elapsed) * 1000
+
+
+# peak of the memory allocated by one call of function, in KiB
+def peak_memory(function):
+  tracemalloc.start()
+  function()
+  peak = tracemalloc.get_traced_memory()[1] / 1024
+  tracemalloc.stop()
+  return peak
+
+
+def before(rows):
+  questions = Question.query.order_by(Question.id).limit(rows).all()
+  return jsonify({'success': True, 'questions': [question.format() for question in questions]}).get_data()
+
+
+def after(rows):
+  questions = Question.query.with_entities(*QUESTION_COLUMNS).order_by(Question.id).limit(rows).all()
+  return json_response({'success': True, 'questions': question_encoder.rows(questions)}).get_data()
+
+
+def categories_before():
+  db.session.expunge_all()
+  return {category.id: category.type for category in Category.query.order_by(Category.id).all()}
+
+
+def categories_after():
+  return dict(Category.query.with_entities(Category.id, Category.type).order_by(Category.id))
+
+
+def report(name, before, after):
+  print('{:<12} {:>10.1f} {:>10.1f} {:>11.0f} {:>11.0f}'.format(name, timed(before), timed(after),
+    peak_memory(before), peak_memory(after)))
+
+
+if __name__ == '__main__':
+  rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+  app = create_app()
+  setup_db(app, database_path)
+
+  with app.test_request_context():
+    last_id = db.session.query(db.func.max(Question.id)).scalar() or 0
+    missing = rows - Question.query.count()
+    if missing > 0:
+      db.session.execute(GENERATE_QUESTIONS, {'rows': missing})
+      db.session.commit()
+
+    try:
+      print('encoder: ' + ('orjson' if orjson is not None else 'json (standard library)'))
+      print('{:<12} {:>10} {:>10} {:>11} {:>11}'.format('listing', 'before ms', 'after ms',
+        'before KiB', 'after KiB'))
+      report('questions', lambda: before(rows), lambda: after(rows))
+      report('categories', categories_before, categories_after)
+    finally:
+      Question.query.filter(Question.id > last_id).delete(synchronize_session=False)
+      db.session.commit()
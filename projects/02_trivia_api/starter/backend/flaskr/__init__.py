@@ -1,24 +1,61 @@
 import os
-from flask import Flask, request, abort, jsonify
+import click
+from flask import Flask, Response, request, abort, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from sqlalchemy import func, or_, text
+
+from models import setup_db, db, Question, Category, search_document
+from fsnd_common.db_pool import register_pool_metrics
+from fsnd_common.serializer import RowEncoder, json_response
+from .quiz import QuestionIndex, next_question
+from .quiz_sessions import QuizSessions, create_session_store
+from .categories import create_category_cache
+from .bulk import import_questions, export_questions
 
 QUESTIONS_PER_PAGE = 10
 
+# the columns of Question.format(), encoded straight from the rows of the query
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer, Question.category, Question.difficulty)
+question_encoder = RowEncoder('id', 'question', 'answer', 'category', 'difficulty')
+
 
-# This method to paginate the questions has been created to make the code less complex
-def paginate_questions(request, selection):
+# This method to paginate the questions has been created to make the code less complex.
+# selection is a query: only the questions of the requested page are loaded (LIMIT/OFFSET)
+# and the total is counted by the database, so a page costs the same whatever the table size
+def paginate_questions(request, selection, order_by=(Question.id,)):
   page = request.args.get('page', 1, type=int)
+  if page < 1:
+    abort(404)
   start = (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
 
-  questions = [question.format() for question in selection]
-  current_questions = questions[start:end]
+  questions = selection.with_entities(*QUESTION_COLUMNS) \
+    .order_by(*order_by).limit(QUESTIONS_PER_PAGE).offset(start).all()
+  current_questions = question_encoder.rows(questions)
+
+  # a partial page is the last one, its total needs no COUNT(*)
+  if 0 < len(questions) < QUESTIONS_PER_PAGE:
+    total_questions = start + len(questions)
+  else:
+    total_questions = selection.order_by(None).count()
+
+  return current_questions, total_questions
 
-  return current_questions
+
+# Full text search over the question and the answer, best matches first. The search
+# term accepts the web search syntax ("quoted phrases", or, -excluded). A term made only
+# of stop words ("the") has no lexemes, so it falls back to a substring match
+def search_questions(search_term):
+  query = func.websearch_to_tsquery(text("'english'::regconfig"), search_term)
+  if db.session.query(func.numnode(query)).scalar() == 0:
+    pattern = '%' + search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    selection = Question.query.filter(or_(Question.question.ilike(pattern), Question.answer.ilike(pattern)))
+    return selection, (Question.id,)
+
+  selection = Question.query.filter(search_document.op('@@')(query))
+  return selection, (func.ts_rank(search_document, query).desc(), Question.id)
 
 
 def create_app(test_config=None):
@@ -30,6 +67,10 @@ def create_app(test_config=None):
   @DONE: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
   '''
   cors = CORS(app)
+  register_pool_metrics(app, db)
+  quiz_index = QuestionIndex()
+  quiz_sessions = QuizSessions(create_session_store(), quiz_index)
+  category_cache = create_category_cache(app)
 
   '''
   @DONE: Use the after_request decorator to set Access-Control-Allow
@@ -46,15 +87,19 @@ def create_app(test_config=None):
   Create an endpoint to handle GET requests 
   for all available categories.
   '''
+  # served from the category cache; a matching If-None-Match gets a 304 without touching the database
   @app.route('/categories')
   def get_categories():
-    categories = Category.query.all()
-    formatted_categories = {category.id:category.type for category in categories}
+    formatted_categories, etag = category_cache.get()
+    if etag in request.if_none_match:
+      return '', 304, {'ETag': '"{}"'.format(etag)}
     
-    return jsonify({
+    response = json_response({
       'success': True,
       'categories': formatted_categories
     })
+    response.set_etag(etag)
+    return response
 
 
   '''
@@ -71,21 +116,20 @@ def create_app(test_config=None):
   '''
   @app.route('/questions')
   def get_paginated_questions():
-    questions = Question.query.order_by(Question.id).all()
-    formatted_questions = paginate_questions(request, questions)
-    total_questions = len(formatted_questions)
+    formatted_questions, total_questions = paginate_questions(request, Question.query)
     current_category = request.args.get('currentCategory', 0, type=int)
-    categories = Category.query.all()
-    formatted_categories = formatted_categories = {category.id:category.type for category in categories}
     
-    # if there are no questions -> Error 404: Resource Not Found
-    if total_questions == 0:
+    # if there are no questions in the page -> Error 404: Resource Not Found
+    if len(formatted_questions) == 0:
       abort(404)
 
-    return jsonify({
+    formatted_categories, etag = category_cache.get()
+
+    return json_response({
       'success': True,
       'questions': formatted_questions,
       'totalQuestions' : total_questions,
+      'total_questions' : total_questions,
       'categories' : formatted_categories,
       'currentCategory' : current_category
     })
@@ -107,6 +151,7 @@ def create_app(test_config=None):
         abort(404)
 
       question.delete()
+      quiz_index.remove(question.id)
       
       return jsonify({
         'success': True,
@@ -141,6 +186,7 @@ def create_app(test_config=None):
       question = Question(question=new_question, answer=new_answer, 
       difficulty=new_difficulty, category=new_category)
       question.insert()
+      quiz_index.add(question.id, question.category)
       
       return jsonify({
         'success': True,
@@ -167,16 +213,17 @@ def create_app(test_config=None):
     body = request.get_json()
 
     search_term = body.get('searchTerm', None)
-    questions = Question.query.filter(Question.question.ilike('%'+search_term+'%')).all()
-    formatted_questions = paginate_questions(request, questions)
-    total_questions = len(questions)
+    if search_term is None:
+      abort(400)
+    questions, order_by = search_questions(search_term)
+    formatted_questions, total_questions = paginate_questions(request, questions, order_by)
     current_category = request.args.get('currentCategory', 0, type=int)
 
-    # if there are no questions -> Error 404: Resource Not Found
-    if total_questions == 0:
+    # if there are no questions in the page -> Error 404: Resource Not Found
+    if len(formatted_questions) == 0:
       abort(404)
     
-    return jsonify({
+    return json_response({
       'success': True,
       'questions': formatted_questions,
       'total_questions' : total_questions,
@@ -196,16 +243,15 @@ def create_app(test_config=None):
   @app.route('/categories/<int:category_id>/questions')
   def get_questions_by_category(category_id):
 
-    questions = Question.query.filter_by(category=category_id).all()
-    formatted_question = [question.format() for question in questions]
-    total_questions = len(questions)
+    questions = Question.query.filter_by(category=category_id)
+    formatted_question, total_questions = paginate_questions(request, questions)
     current_category = category_id
 
-    # if there are no questions -> Error 404: Resource Not Found
-    if total_questions == 0:
+    # if there are no questions in the page -> Error 404: Resource Not Found
+    if len(formatted_question) == 0:
       abort(404)
 
-    return jsonify({
+    return json_response({
       'success': True,
       'questions': formatted_question,
       'total_questions': total_questions,
@@ -229,14 +275,12 @@ def create_app(test_config=None):
 
     body = request.get_json()
 
-    previous_questions = body.get('previous_questions', None)
+    previous_questions = body.get('previous_questions', None) or []
     quiz_category = body.get('quiz_category', None)
-    quiz_category_id = quiz_category['id']
+    quiz_category_id = int(quiz_category['id'])
 
-    if quiz_category_id == 0:
-      new_question = Question.query.filter(Question.id.notin_(previous_questions)).first()
-    else:
-      new_question = Question.query.filter(Question.id.notin_(previous_questions)).filter_by(category=quiz_category_id).first()
+    # random unseen question drawn from the in-memory index, fetched by primary key
+    new_question = next_question(quiz_index, quiz_category_id, previous_questions)
 
     # if there is no question -> Error 404: Resource Not Found
     if new_question is None:
@@ -248,6 +292,109 @@ def create_app(test_config=None):
     })
 
 
+  '''
+  Bulk import and export of questions as NDJSON (one JSON question per line).
+  The import reports the errors of every rejected line; valid lines are
+  inserted in batches even when other lines are rejected.
+  '''
+  @app.route('/questions/import', methods=['POST'])
+  def import_questions_ndjson():
+
+    report = import_questions(request.stream, category_cache.category_ids())
+    quiz_index.invalidate()
+
+    return jsonify({
+      'success': True,
+      **report.format()
+    })
+
+
+  @app.route('/questions/export')
+  def export_questions_ndjson():
+    return Response(stream_with_context(export_questions()), mimetype='application/x-ndjson')
+
+
+  @app.cli.group('questions')
+  def questions_cli():
+    """Bulk import and export of questions as NDJSON."""
+
+
+  @questions_cli.command('import')
+  @click.argument('path', type=click.File('r'))
+  @click.option('--batch-size', default=1000, show_default=True, help='Questions inserted per transaction.')
+  def import_questions_command(path, batch_size):
+    """Imports the questions of an NDJSON file."""
+    report = import_questions(path, category_cache.category_ids(), batch_size,
+      on_batch=lambda report: click.echo('{} questions imported'.format(report.imported)))
+    for error in report.errors:
+      click.echo('line {}: {}'.format(error['line'], '; '.join(error['errors'])), err=True)
+    click.echo('{} questions imported, {} rejected'.format(report.imported, report.rejected))
+
+
+  @questions_cli.command('export')
+  @click.argument('path', type=click.File('w'), default='-')
+  def export_questions_command(path):
+    """Exports every question to an NDJSON file (standard output by default)."""
+    for lines in export_questions():
+      path.write(lines)
+
+
+  '''
+  Quiz sessions: the deck of unseen questions is kept on the server, so the
+  client only sends the session id to get the next question.
+  '''
+  @app.route('/quizzes/sessions', methods=['POST'])
+  def create_quiz_session():
+
+    body = request.get_json() or {}
+    quiz_category = body.get('quiz_category', None) or {'id': 0}
+
+    try:
+      quiz_category_id = int(quiz_category['id'])
+    except (KeyError, TypeError, ValueError):
+      abort(400)
+
+    session_id, total_questions = quiz_sessions.start(quiz_category_id)
+
+    # if there are no questions in the category -> Error 404: Resource Not Found
+    if total_questions == 0:
+      quiz_sessions.end(session_id)
+      abort(404)
+
+    return jsonify({
+      'success': True,
+      'session_id': session_id,
+      'total_questions': total_questions
+    })
+
+
+  @app.route('/quizzes/sessions/<session_id>/next', methods=['POST'])
+  def get_quiz_session_question(session_id):
+
+    # unknown or expired session -> Error 404: Resource Not Found
+    try:
+      question = quiz_sessions.next_question(session_id)
+    except KeyError:
+      abort(404)
+
+    # question is None once every question of the session has been played
+    return jsonify({
+      'success': True,
+      'question': question.format() if question is not None else None
+    })
+
+
+  @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+  def delete_quiz_session(session_id):
+
+    quiz_sessions.end(session_id)
+
+    return jsonify({
+      'success': True,
+      'session_id': session_id
+    })
+
+
   '''
   @DONE: 
   Create error handlers for all expected errors 
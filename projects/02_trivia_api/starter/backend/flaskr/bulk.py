@@ -0,0 +1,153 @@
+import json
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question
+
+
+'''
+Bulk import and export of questions as NDJSON, one question per line:
+
+    {"question": "...", "answer": "...", "difficulty": 1, "category": 4}
+
+Imported rows are validated one by one and inserted in batches, each batch
+with a single executemany in its own transaction. Exports are read with a
+server-side cursor, so neither direction holds the whole table in memory.
+'''
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+EXPORT_COLUMNS = ('id', 'question', 'answer', 'difficulty', 'category')
+
+
+# int value of an integer or of a string of digits, None for anything else
+def as_int(value):
+  if isinstance(value, bool):
+    return None
+  if isinstance(value, int):
+    return value
+  if isinstance(value, str) and value.strip().isdigit():
+    return int(value)
+  return None
+
+
+'''
+validate_question(row, category_ids)
+    returns the record to insert for a decoded row and the list of its errors
+'''
+def validate_question(row, category_ids):
+  if not isinstance(row, dict):
+    return None, ['a JSON object is expected']
+
+  errors = []
+  for field in ('question', 'answer'):
+    if not isinstance(row.get(field), str) or not row[field].strip():
+      errors.append('{} must be a non empty string'.format(field))
+
+  difficulty = as_int(row.get('difficulty'))
+  if difficulty is None or not 1 <= difficulty <= 5:
+    errors.append('difficulty must be an integer from 1 to 5')
+
+  category = as_int(row.get('category'))
+  if category not in category_ids:
+    errors.append('category must be the id of an existing category')
+
+  if errors:
+    return None, errors
+  return {
+    'question': row['question'].strip(),
+    'answer': row['answer'].strip(),
+    'difficulty': difficulty,
+    'category': category
+  }, []
+
+
+'''
+ImportReport
+    counts of an import, and the errors of the first MAX_REPORTED_ERRORS rejected lines
+'''
+class ImportReport:
+  def __init__(self):
+    self.imported = 0
+    self.rejected = 0
+    self.errors = []
+
+  def reject(self, line_number, errors):
+    self.rejected += 1
+    if len(self.errors) < MAX_REPORTED_ERRORS:
+      self.errors.append({'line': line_number, 'errors': errors})
+
+  def format(self):
+    return {
+      'imported': self.imported,
+      'rejected': self.rejected,
+      'errors': self.errors
+    }
+
+
+'''
+import_questions(lines, category_ids)
+    imports the NDJSON lines (str or bytes) and returns the ImportReport.
+    on_batch(report) is called after every committed batch. A batch that the
+    database refuses is rolled back, its lines are reported as rejected and the
+    import goes on with the next batch
+'''
+def import_questions(lines, category_ids, batch_size=BATCH_SIZE, on_batch=None):
+  report = ImportReport()
+  batch = []
+
+  def write(batch):
+    if not batch:
+      return
+    try:
+      db.session.execute(Question.__table__.insert(), [record for line_number, record in batch])
+      db.session.commit()
+    except SQLAlchemyError as error:
+      db.session.rollback()
+      for line_number, record in batch:
+        report.reject(line_number, ['not written, the database refused its batch: ' + type(error).__name__])
+      return
+    report.imported += len(batch)
+    if on_batch is not None:
+      on_batch(report)
+
+  for line_number, line in enumerate(lines, start=1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError as error:
+      report.reject(line_number, ['invalid JSON: ' + str(error)])
+      continue
+
+    record, errors = validate_question(row, category_ids)
+    if errors:
+      report.reject(line_number, errors)
+      continue
+
+    batch.append((line_number, record))
+    if len(batch) >= batch_size:
+      write(batch)
+      batch = []
+
+  write(batch)
+  return report
+
+
+'''
+export_questions()
+    yields every question as an NDJSON line, in id order, read with a server-side cursor
+'''
+def export_questions(batch_size=BATCH_SIZE):
+  columns = [Question.__table__.c[name] for name in EXPORT_COLUMNS]
+  connection = db.engine.connect().execution_options(stream_results=True)
+  try:
+    result = connection.execute(select(columns).order_by(Question.__table__.c.id))
+    while True:
+      rows = result.fetchmany(batch_size)
+      if not rows:
+        break
+      yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in rows)
+  finally:
+    connection.close()
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import Category
+
+
+'''
+CategoryCache
+    process-level cache of the {id: type} map of the categories and of its ETag.
+    The ids of the map are strings, as in the JSON responses, so the map is
+    encoded as it is; category_ids() returns the integer ids.
+    The map is loaded on first use and kept until invalidate() is called, which
+    happens automatically when a session of its app that changed a category commits, or
+    until ttl seconds have passed (CATEGORY_CACHE_TTL, 0 for no expiry), which
+    picks up the changes made by other processes
+'''
+class CategoryCache:
+  def __init__(self, ttl=0):
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.entry = None
+
+  def load(self):
+    # (id, type) rows, no Category entity is loaded
+    categories = Category.query.with_entities(Category.id, Category.type).order_by(Category.id)
+    formatted_categories = {str(category_id): type for category_id, type in categories}
+    body = json.dumps(formatted_categories, sort_keys=True).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()
+    category_ids = frozenset(int(category_id) for category_id in formatted_categories)
+    return formatted_categories, etag, time.monotonic(), category_ids
+
+  def expired(self, entry):
+    return entry is None or (self.ttl and time.monotonic() - entry[2] > self.ttl)
+
+  def current(self):
+    entry = self.entry
+    if self.expired(entry):
+      with self.lock:
+        entry = self.entry
+        if self.expired(entry):
+          entry = self.entry = self.load()
+    return entry
+
+  # returns the category map and its ETag
+  def get(self):
+    entry = self.current()
+    return entry[0], entry[1]
+
+  # returns the frozenset of the ids of the categories
+  def category_ids(self):
+    return self.current()[3]
+
+  def invalidate(self):
+    self.entry = None
+
+
+# the listeners are global (mapper and Session events), they are registered once per
+# process whatever the number of apps, and invalidate the cache of the current app
+watch_lock = threading.Lock()
+watching = False
+
+
+def watch_categories():
+  global watching
+  with watch_lock:
+    if watching:
+      return
+    watching = True
+
+  def category_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+      session.info['categories_changed'] = True
+
+  def after_commit(session):
+    if session.info.pop('categories_changed', False) and has_app_context():
+      category_cache = current_app.extensions.get('category_cache')
+      if category_cache is not None:
+        category_cache.invalidate()
+
+  def after_rollback(session):
+    session.info.pop('categories_changed', None)
+
+  for name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Category, name, category_changed)
+  event.listen(Session, 'after_commit', after_commit)
+  event.listen(Session, 'after_rollback', after_rollback)
+
+
+'''
+create_category_cache(app)
+    returns the category cache of the app, which is invalidated after the commit of
+    every session of the app that changed a category
+'''
+def create_category_cache(app):
+  category_cache = CategoryCache(int(os.environ.get('CATEGORY_CACHE_TTL', 0)))
+  app.extensions['category_cache'] = category_cache
+  watch_categories()
+  return category_cache
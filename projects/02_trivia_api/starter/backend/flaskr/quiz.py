@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+
+from models import db, Question
+
+
+'''
+IdList
+    question ids kept in a list, for random picks, and indexed by a dict of their
+    positions, so an id is removed in constant time by moving the last id into its slot
+'''
+class IdList:
+  def __init__(self, ids=()):
+    self.ids = []
+    self.positions = {}
+    for question_id in ids:
+      self.add(question_id)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, question_id):
+    if question_id not in self.positions:
+      self.positions[question_id] = len(self.ids)
+      self.ids.append(question_id)
+
+  def remove(self, question_id):
+    position = self.positions.pop(question_id, None)
+    if position is None:
+      return
+    last = self.ids.pop()
+    if last != question_id:
+      self.ids[position] = last
+      self.positions[last] = position
+
+  # a uniformly random id that is not in excluded, None when there is none. The time
+  # depends on the number of excluded ids only: the r-th id outside of them is found by
+  # skipping the (sorted) positions of the excluded ids
+  def choice_excluding(self, excluded):
+    skipped = sorted(self.positions[question_id] for question_id in excluded if question_id in self.positions)
+    left = len(self.ids) - len(skipped)
+    if left <= 0:
+      return None
+    position = random.randrange(left)
+    for skipped_position in skipped:
+      if skipped_position > position:
+        break
+      position += 1
+    return self.ids[position]
+
+
+'''
+QuestionIndex
+    in-memory index of the question ids of every category, used to draw quiz
+    questions without querying the questions table. The index is updated when
+    questions are inserted or deleted through the API, and reloaded after
+    max_age seconds so it also picks up the changes made by other processes
+'''
+class QuestionIndex:
+  def __init__(self, max_age=60, attempts=8):
+    self.max_age = max_age
+    self.attempts = attempts
+    self.lock = threading.Lock()
+    self.loaded_at = None
+    self.ids = IdList()
+    self.ids_by_category = {}
+    self.category_of = {}
+
+  def load(self):
+    # read in (category, id) order, an index only scan of ix_questions_category_id
+    rows = db.session.query(Question.id, Question.category) \
+      .order_by(Question.category, Question.id).all()
+    ids = IdList()
+    ids_by_category = {}
+    category_of = {}
+    for question_id, category in rows:
+      ids.add(question_id)
+      if category is not None:
+        ids_by_category.setdefault(int(category), IdList()).add(question_id)
+        category_of[question_id] = int(category)
+    with self.lock:
+      self.ids = ids
+      self.ids_by_category = ids_by_category
+      self.category_of = category_of
+      self.loaded_at = time.monotonic()
+
+  # the index is reloaded on next use, after changes made outside the API (e.g. bulk imports)
+  def invalidate(self):
+    with self.lock:
+      self.loaded_at = None
+
+  def ensure_loaded(self):
+    if self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age:
+      self.load()
+
+  def add(self, question_id, category):
+    with self.lock:
+      if self.loaded_at is None:
+        return
+      self.ids.add(question_id)
+      if category is not None:
+        self.ids_by_category.setdefault(int(category), IdList()).add(question_id)
+        self.category_of[question_id] = int(category)
+
+  def remove(self, question_id):
+    with self.lock:
+      if self.loaded_at is None:
+        return
+      self.ids.remove(question_id)
+      category = self.category_of.pop(question_id, None)
+      if category is not None:
+        self.ids_by_category[category].remove(question_id)
+
+  def category_list(self, category_id):
+    return self.ids if category_id == 0 else self.ids_by_category.get(category_id, IdList())
+
+  # copy of the ids of the category (0 for all the categories)
+  def category_ids(self, category_id):
+    self.ensure_loaded()
+    with self.lock:
+      return list(self.category_list(category_id).ids)
+
+  '''
+  draw(category_id, previous_questions)
+      returns a random id of the category (0 for all the categories) that is not
+      in previous_questions, or None when every question has been seen. The time
+      does not depend on the number of questions of the category
+  '''
+  def draw(self, category_id, previous_questions):
+    self.ensure_loaded()
+    previous = set(previous_questions)
+    with self.lock:
+      ids = self.category_list(category_id)
+      if len(previous) < len(ids):
+        # while most of the questions are unseen a few random picks find one
+        for _ in range(self.attempts):
+          question_id = random.choice(ids.ids)
+          if question_id not in previous:
+            return question_id
+      return ids.choice_excluding(previous)
+
+
+'''
+next_question(index, category_id, previous_questions)
+    returns a random unseen question of the category, fetched by primary key,
+    or None when there are no questions left
+'''
+def next_question(index, category_id, previous_questions):
+  while True:
+    question_id = index.draw(category_id, previous_questions)
+    if question_id is None:
+      return None
+    question = Question.query.get(question_id)
+    if question is not None:
+      return question
+    # deleted by another process since the index was loaded
+    index.remove(question_id)
@@ -0,0 +1,137 @@
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+from models import Question
+
+
+'''
+Quiz sessions keep the shuffled deck of the questions a player has not seen yet
+on the server, so every "next question" call only carries the session id.
+
+The store is chosen with QUIZ_SESSION_STORE ('memory', the default, or 'redis',
+which needs the optional redis package and QUIZ_REDIS_URL). Sessions expire
+QUIZ_SESSION_TTL seconds (default 3600) after their last use.
+'''
+
+
+'''
+MemorySessionStore
+    decks kept in the memory of the process. Expired sessions are evicted when
+    they are used and by a sweep of the whole store every sweep_interval seconds
+'''
+class MemorySessionStore:
+  def __init__(self, ttl=3600, sweep_interval=60):
+    self.ttl = ttl
+    self.sweep_interval = sweep_interval
+    self.lock = threading.Lock()
+    self.decks = {}
+    self.swept_at = time.monotonic()
+
+  def create(self, session_id, ids):
+    now = time.monotonic()
+    with self.lock:
+      if now - self.swept_at > self.sweep_interval:
+        self.decks = {key: entry for key, entry in self.decks.items() if entry[1] > now}
+        self.swept_at = now
+      self.decks[session_id] = (deque(ids), now + self.ttl)
+
+  # returns the next id of the deck, None when it is empty. KeyError if the session has expired
+  def pop(self, session_id):
+    now = time.monotonic()
+    with self.lock:
+      deck, expires_at = self.decks[session_id]
+      if expires_at <= now:
+        del self.decks[session_id]
+        raise KeyError(session_id)
+      self.decks[session_id] = (deck, now + self.ttl)
+      return deck.popleft() if deck else None
+
+  def delete(self, session_id):
+    with self.lock:
+      self.decks.pop(session_id, None)
+
+
+'''
+RedisSessionStore
+    decks kept in a Redis compatible server as lists, shared by all the workers.
+    Redis removes empty lists, so a separate key records that the session exists
+'''
+class RedisSessionStore:
+  def __init__(self, url, ttl=3600, prefix='trivia:quiz:'):
+    import redis
+
+    self.client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def keys(self, session_id):
+    return self.prefix + session_id, self.prefix + session_id + ':deck'
+
+  def create(self, session_id, ids):
+    session_key, deck_key = self.keys(session_id)
+    pipeline = self.client.pipeline()
+    pipeline.set(session_key, 1, ex=self.ttl)
+    if ids:
+      pipeline.rpush(deck_key, *ids)
+      pipeline.expire(deck_key, self.ttl)
+    pipeline.execute()
+
+  def pop(self, session_id):
+    session_key, deck_key = self.keys(session_id)
+    pipeline = self.client.pipeline()
+    pipeline.expire(session_key, self.ttl)
+    pipeline.lpop(deck_key)
+    pipeline.expire(deck_key, self.ttl)
+    exists, question_id, _ = pipeline.execute()
+    if not exists:
+      raise KeyError(session_id)
+    return None if question_id is None else int(question_id)
+
+  def delete(self, session_id):
+    self.client.delete(*self.keys(session_id))
+
+
+# creates the session store described by the QUIZ_* environment variables
+def create_session_store():
+  ttl = int(os.environ.get('QUIZ_SESSION_TTL', 3600))
+  if os.environ.get('QUIZ_SESSION_STORE', 'memory') == 'redis':
+    return RedisSessionStore(os.environ['QUIZ_REDIS_URL'], ttl)
+  return MemorySessionStore(ttl)
+
+
+'''
+QuizSessions
+    creates the sessions from the question index and deals their questions
+'''
+class QuizSessions:
+  def __init__(self, store, index):
+    self.store = store
+    self.index = index
+
+  # starts a session over the questions of the category (0 for all), returns its id and size
+  def start(self, category_id):
+    ids = self.index.category_ids(category_id)
+    random.shuffle(ids)
+    session_id = uuid.uuid4().hex
+    self.store.create(session_id, ids)
+    return session_id, len(ids)
+
+  # returns the next question of the deck, None once the deck is empty.
+  # KeyError if the session does not exist or has expired
+  def next_question(self, session_id):
+    while True:
+      question_id = self.store.pop(session_id)
+      if question_id is None:
+        return None
+      question = Question.query.get(question_id)
+      if question is not None:
+        return question
+      # deleted since the session started
+      self.index.remove(question_id)
+
+  def end(self, session_id):
+    self.store.delete(session_id)
@@ -0,0 +1,7 @@
+-- Full text search index over the question and the answer of the questions.
+-- The expression must stay identical to models.search_document.
+--
+--   psql trivia < migrations/001_questions_search_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search ON public.questions
+    USING gin (to_tsvector('english'::regconfig, coalesce(question, '') || ' ' || coalesce(answer, '')));
@@ -0,0 +1,31 @@
+-- questions.category as an integer foreign key to categories.id, indexed with the
+-- question id so the questions of a category are read with an index range scan.
+-- Databases restored from trivia.psql already have the integer column and the
+-- foreign key; only the index is created for them.
+--
+--   psql trivia < migrations/002_questions_category_foreign_key.sql
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'questions' AND column_name = 'category') <> 'integer' THEN
+        ALTER TABLE public.questions ALTER COLUMN category TYPE integer
+            USING nullif(trim(category), '')::integer;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conrelid = 'public.questions'::regclass AND confrelid = 'public.categories'::regclass
+                   AND contype = 'f') THEN
+        UPDATE public.questions SET category = NULL
+            WHERE category NOT IN (SELECT id FROM public.categories);
+        ALTER TABLE public.questions ADD CONSTRAINT questions_category_fkey
+            FOREIGN KEY (category) REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_category_id ON public.questions (category, id);
@@ -1,8 +1,10 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, create_engine, func, text
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from fsnd_common.db_pool import engine_options
+
 database_name = "trivia"
 database_path = "postgres://{}:{}@{}/{}".format('postgres','EresTonto','localhost:5432', database_name)
 
@@ -15,6 +17,7 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -25,11 +28,15 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (
+    # the questions of a category, in id order, are an index range scan
+    Index('ix_questions_category_id', 'category', 'id'),
+  )
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -58,6 +65,16 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+'''
+search_document
+    text search document of a question, made of its question and answer. Queries
+    must use this exact expression to be served by the ix_questions_search index
+'''
+search_document = func.to_tsvector(text("'english'::regconfig"),
+  func.coalesce(Question.question, '') + ' ' + func.coalesce(Question.answer, ''))
+
+Index('ix_questions_search', search_document, postgresql_using='gin')
+
 '''
 Category
 
@@ -50,6 +50,16 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['totalQuestions'])
 
 
+    # a page holds at most 10 questions and totalQuestions counts all of them
+    def test_200_get_questions_total_is_not_page_length(self):
+        res = self.client().get('/questions?page=1')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(len(data['questions']), 10)
+        self.assertEqual(data['totalQuestions'], Question.query.count())
+
+
     # get questions with pagination non existing should return 404 response
     def test_404_get_paginated_questions(self):
         res = self.client().get('/questions?page=9999')
@@ -123,6 +133,31 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['message'], "Resource Not Found")
 
     
+    # search accepts the web search syntax and returns the best matches first
+    def test_200_search_web_syntax_and_ranking(self):
+        with self.app.app_context():
+            narwhals = Question("Which narwhal lives in the arctic fjords?", "The Greenland narwhal", 1, 2)
+            tusks = Question("Where do narwhal tusks end up?", "In antique collections", 1, 2)
+            narwhals.insert()
+            tusks.insert()
+            ids = [narwhals.id, tusks.id]
+
+        def search(term):
+            res = self.client().post('/search', json={'searchTerm': term})
+            self.assertEqual(res.status_code, 200)
+            return [question['id'] for question in json.loads(res.data)['questions'] if question['id'] in ids]
+
+        try:
+            # the question mentioning narwhal twice ranks first
+            self.assertEqual(search('narwhal'), ids)
+            self.assertEqual(search('"arctic fjords"'), ids[:1])
+            self.assertEqual(search('narwhal -greenland'), ids[1:])
+        finally:
+            with self.app.app_context():
+                Question.query.filter(Question.id.in_(ids)).delete(synchronize_session=False)
+                Question.query.session.commit()
+
+
     # get questions by existing category should return success response
     def test_200_get_questions_by_category(self):
         res = self.client().get('/categories/5/questions')
@@ -144,6 +179,38 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['message'], "Resource Not Found")
 
 
+    # import questions as NDJSON should insert the valid lines and report the rejected ones
+    def test_200_import_questions(self):
+        lines = [
+            json.dumps({'question': "imported question", 'answer': "imported answer", 'difficulty': 2, 'category': 1}),
+            json.dumps({'question': "", 'answer': "imported answer", 'difficulty': 2, 'category': 99})
+        ]
+        res = self.client().post('/questions/import', data='\n'.join(lines), content_type='application/x-ndjson')
+
+        data = json.loads(res.data)
+        with self.app.app_context():
+            Question.query.filter(Question.question == "imported question").delete(synchronize_session=False)
+            Question.query.session.commit()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['rejected'], 1)
+        self.assertEqual(data['errors'][0]['line'], 2)
+
+
+    # export questions should stream every question as NDJSON
+    def test_200_export_questions(self):
+        res = self.client().get('/questions/export')
+
+        lines = res.data.decode('utf-8').splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        with self.app.app_context():
+            self.assertEqual(len(lines), Question.query.count())
+        self.assertIn('question', json.loads(lines[0]))
+
+
     # get quiz questions using correct request body should return success response
     def test_200_get_quizzes(self):
         res = self.client().post('/quizzes', json={'previous_questions':[], 'quiz_category': {'id':1,'type':'Science'}})
@@ -154,6 +221,20 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
 
 
+    # quiz questions are drawn among the unseen questions of the category
+    def test_200_get_quizzes_skips_previous_questions(self):
+        with self.app.app_context():
+            ids = [question.id for question in Question.query.filter_by(category=1).all()]
+        previous_questions = ids[:-1]
+
+        res = self.client().post('/quizzes', json={'previous_questions': previous_questions, 'quiz_category': {'id':1,'type':'Science'}})
+
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], ids[-1])
+
+
     # get quiz questions using wrong request parameters should return 404 response
     def test_404_get_quizzes_of_inexistent_category(self):
         res = self.client().post('/quizzes', json={'previous_questions':[], 'quiz_category': {'id':99,'type':'Non existing'}})
@@ -165,6 +246,38 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['message'], "Resource Not Found")
 
 
+    # a quiz session deals every question of the category once, then returns no question
+    def test_200_quiz_session_deals_each_question_once(self):
+        res = self.client().post('/quizzes/sessions', json={'quiz_category': {'id':1,'type':'Science'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        session_id = data['session_id']
+
+        dealt = []
+        for _ in range(data['total_questions']):
+            res = self.client().post('/quizzes/sessions/{}/next'.format(session_id))
+            dealt.append(json.loads(res.data)['question']['id'])
+
+        res = self.client().post('/quizzes/sessions/{}/next'.format(session_id))
+        data = json.loads(res.data)
+
+        self.assertEqual(len(set(dealt)), len(dealt))
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(data['question'])
+
+
+    # next question of a non existing quiz session should return 404 response
+    def test_404_next_question_of_inexistent_quiz_session(self):
+        res = self.client().post('/quizzes/sessions/inexistent/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], "Resource Not Found")
+
+
     # get categories should return success response
     def test_200_get_categories(self):
         res = self.client().get('/categories')
@@ -173,8 +286,19 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
+
+
+    # get categories with the ETag of the previous response should return 304 response
+    def test_304_get_categories_not_modified(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], etag)
  
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
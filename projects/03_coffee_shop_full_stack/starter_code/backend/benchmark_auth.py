@@ -0,0 +1,87 @@
+'''
+Benchmark of the authentication path of requires_auth.
+
+It runs offline: a RSA key is generated locally, its public key is served to
+the API from a local JWKS file, and the same token is sent again and again,
+as the frontends do. Run it from the backend directory:
+
+    python benchmark_auth.py [requests]
+'''
+
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+from Crypto.PublicKey import RSA
+from flask import Flask
+from jose import jwt
+
+KID = 'benchmark'
+
+
+def base64url(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+# writes the JWKS of a new key to jwks_path and returns the private key (PEM)
+def generate_key_set(jwks_path):
+    key = RSA.generate(2048)
+    jwks = {'keys': [{
+        'kty': 'RSA', 'kid': KID, 'use': 'sig', 'alg': 'RS256',
+        'n': base64url(key.n), 'e': base64url(key.e)
+    }]}
+    with open(jwks_path, 'w') as jwks_file:
+        json.dump(jwks, jwks_file)
+    return key.exportKey('PEM').decode('ascii')
+
+
+def make_token(private_key, domain, audience, permissions):
+    claims = {
+        'iss': 'https://' + domain + '/',
+        'aud': audience,
+        'sub': 'benchmark',
+        'iat': int(time.time()),
+        'exp': int(time.time()) + 3600,
+        'permissions': permissions
+    }
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': KID})
+
+
+def benchmark(requests, jwks_path):
+    private_key = generate_key_set(jwks_path)
+    from src.auth import auth
+
+    app = Flask(__name__)
+
+    @auth.requires_auth('get:drinks-detail')
+    def protected(payload):
+        return payload
+
+    token = make_token(private_key, auth.AUTH0_DOMAIN, auth.API_AUDIENCE, ['get:drinks-detail'])
+    headers = {'Authorization': 'Bearer ' + token}
+
+    print('{:<14} {:>10} {:>14}'.format('token cache', 'requests', 'us/request'))
+    try:
+        for cached in (False, True):
+            auth.token_cache.clear()
+            with app.test_request_context('/drinks-detail', headers=headers):
+                start = time.perf_counter()
+                for _ in range(requests):
+                    if not cached:
+                        auth.token_cache.clear()
+                    protected()
+                elapsed = time.perf_counter() - start
+            print('{:<14} {:>10} {:>14.1f}'.format('on' if cached else 'off', requests, elapsed * 1e6 / requests))
+    finally:
+        os.remove(jwks_path)
+
+
+if __name__ == '__main__':
+    # the API reads its keys from the local key set written by generate_key_set
+    jwks_path = os.path.join(tempfile.gettempdir(), 'coffee-benchmark-jwks.json')
+    os.environ['JWKS_SOURCE'] = jwks_path
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, jwks_path)
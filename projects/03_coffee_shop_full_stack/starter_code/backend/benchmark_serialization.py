@@ -0,0 +1,119 @@
+'''
+Benchmark of the drinks list endpoints with 10k drinks.
+
+The drinks are added to the database of the API (src/database/database.db)
+and removed at the end. Each endpoint is timed as it was before the
+serialization cache and the menu snapshot (ORM entities, json.loads of every
+recipe, jsonify) and as it is now, cold (nothing cached) and warm. The time
+and the peak memory (tracemalloc) of loading the drinks as ORM entities and as
+the projected columns are printed too. Run it from the backend directory:
+
+    python benchmark_serialization.py [drinks]
+'''
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from flask import jsonify
+
+from benchmark_auth import generate_key_set, make_token
+
+REPEAT = 5
+
+
+def timed(function):
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed) * 1000
+
+
+# peak of the memory allocated by one call of function, in KiB
+def peak_memory(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark(size, jwks_path):
+    private_key = generate_key_set(jwks_path)
+    from src.api import app, menu
+    from src.auth.auth import AUTH0_DOMAIN, API_AUDIENCE
+    from src.database.models import db, Drink
+
+    token = make_token(private_key, AUTH0_DOMAIN, API_AUDIENCE, ['get:drinks-detail'])
+    headers = {'Authorization': 'Bearer ' + token}
+    client = app.test_client()
+
+    # the endpoints as they were: every drink loaded and serialized on every request
+    def legacy(form):
+        with app.app_context():
+            drinks = Drink.query.all()
+            if form == 'short':
+                drinks = [{'id': drink.id, 'title': drink.title,
+                           'recipe': [{'color': r['color'], 'parts': r['parts']} for r in drink.recipe]}
+                          for drink in drinks]
+            else:
+                drinks = [{'id': drink.id, 'title': drink.title, 'recipe': drink.recipe} for drink in drinks]
+            jsonify({'success': True, 'drinks': drinks, 'status': 200}).get_data()
+
+    def cold(path):
+        Drink.serialized.clear()
+        menu.invalidate()
+        client.get(path, headers=headers).get_data()
+
+    def warm(path):
+        client.get(path, headers=headers).get_data()
+
+    def load_entities():
+        with app.app_context():
+            return [(drink.id, drink.title, drink.recipe) for drink in Drink.query.all()]
+
+    def load_columns():
+        with app.app_context():
+            return Drink.projected().all()
+
+    def not_modified():
+        etag = client.get('/drinks').headers['ETag']
+        return lambda: client.get('/drinks', headers={'If-None-Match': etag})
+
+    with app.app_context():
+        db.session.execute(Drink.__table__.insert(), [{
+            'title': 'Benchmark drink {}'.format(i),
+            'recipe': [{'name': 'espresso', 'color': 'brown', 'parts': 1},
+                       {'name': 'milk', 'color': 'white', 'parts': 2 + i % 3}],
+            'version': 1
+        } for i in range(size)])
+        db.session.commit()
+
+    try:
+        print('{:<16} {:>10} {:>10} {:>10} {:>10}'.format('endpoint', 'before ms', 'cold ms', 'warm ms', '304 ms'))
+        print('{:<16} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format('/drinks',
+            timed(lambda: legacy('short')), timed(lambda: cold('/drinks')), timed(lambda: warm('/drinks')),
+            timed(not_modified())))
+        print('{:<16} {:>10.1f} {:>10.1f} {:>10.1f} {:>10}'.format('/drinks-detail',
+            timed(lambda: legacy('long')), timed(lambda: cold('/drinks-detail')),
+            timed(lambda: warm('/drinks-detail')), '-'))
+        print()
+        print('{:<16} {:>10} {:>10} {:>12}'.format('load drinks', 'ms', 'peak KiB', 'KiB/drink'))
+        for name, load in (('entities', load_entities), ('columns', load_columns)):
+            peak = peak_memory(load)
+            print('{:<16} {:>10.1f} {:>10.0f} {:>12.2f}'.format(name, timed(load), peak, peak / size))
+    finally:
+        with app.app_context():
+            Drink.query.filter(Drink.title.like('Benchmark drink %')).delete(synchronize_session=False)
+            db.session.commit()
+        os.remove(jwks_path)
+
+
+if __name__ == '__main__':
+    jwks_path = os.path.join(tempfile.gettempdir(), 'coffee-benchmark-jwks.json')
+    os.environ['JWKS_SOURCE'] = jwks_path
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, jwks_path)
@@ -1,18 +1,24 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort
 from sqlalchemy import exc
+from sqlalchemy.orm.exc import StaleDataError
 from functools import wraps
 from jose import jwt
 import json
 from flask_cors import CORS
 from urllib.request import urlopen
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
-from .auth.auth import AuthError, requires_auth
+from fsnd_common.db_pool import register_pool_metrics
+from fsnd_common.serializer import json_response
+from .database.models import db_drop_and_create_all, db_upgrade, setup_db, db, Drink
+from .auth.auth import AuthError, requires_auth, any_of, jwks_cache
+from .menu import create_menu_snapshot, cache_control
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+register_pool_metrics(app, db)
+menu = create_menu_snapshot()
 
 
 '''
@@ -23,6 +29,15 @@ CORS(app)
 # db_drop_and_create_all()
 
 
+'''
+flask upgrade-db
+    applies the schema changes introduced since the database was created (see db_upgrade)
+'''
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    db_upgrade()
+
+
 ## ROUTES
 '''
 @DONE implement endpoint
@@ -34,17 +49,17 @@ CORS(app)
 '''
 @app.route('/drinks')
 def get_drinks():
-    drinks = Drink.query.all()
-    drinks_formatted = [drink.short() for drink in drinks]
+    # the serialized menu is rebuilt only when a drink changes, see menu.py
+    body, etag, drinks_count = menu.get()
+    headers = {'ETag': '"{}"'.format(etag), 'Cache-Control': cache_control()}
+
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
 
-    if len(drinks) == 0:
+    if drinks_count == 0:
         abort(400)
     
-    return jsonify({
-      'success': True,
-      'drinks' : drinks_formatted,
-      'status': 200
-    }), 200
+    return Response(body, status=200, headers=headers, mimetype='application/json')
 
     
 '''
@@ -56,19 +71,19 @@ def get_drinks():
         or appropriate status code indicating reason for failure
 '''
 @app.route('/drinks-detail')
-@requires_auth('get:drink-detail')
+# get:drinks-detail is the documented permission, get:drink-detail the one this route used to require
+@requires_auth(any_of('get:drinks-detail', 'get:drink-detail'))
 def get_drinks_detail(payload):
-    drinks = Drink.query.all()
-    drinks_formatted = [drink.long() for drink in drinks]
+    drinks_formatted = Drink.serialize_all('long')
 
-    if len(drinks) == 0:
+    if len(drinks_formatted) == 0:
         abort(404)
     
-    return jsonify({
+    return json_response({
       'success': True,
       'drinks' : drinks_formatted,
       'status': 200
-    }), 200
+    }, 200)
 
 
 '''
@@ -91,7 +106,7 @@ def post_drink(payload):
 
     drink_formatted = []
     try:
-        drink = Drink(id=id, title=title, recipe=json.dumps(recipe))
+        drink = Drink(id=id, title=title, recipe=recipe)
         drink.insert()
         drink_formatted = [drink.long()]
     except:
@@ -170,6 +185,20 @@ def delete_drink(payload, id):
     }), 200
 
 
+'''
+GET /metrics/auth
+    returns the state of the verification keys of this process: number of keys, age,
+    fetches (count, failures, latency) and key lookups (hits, misses)
+'''
+@app.route('/metrics/auth')
+def get_auth_metrics():
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'jwks': jwks_cache.metrics()
+    })
+
+
 ## Error Handling
 '''
 Example error handling for unprocessable entity
@@ -233,6 +262,20 @@ def not_allowed(error):
 @TODO implement error handler for AuthError
     error handler should conform to general task above 
 '''
+'''
+A drink updated or deleted by another request since it was read: its version
+changed, so the update was not applied
+'''
+@app.errorhandler(StaleDataError)
+def conflict(error):
+    db.session.rollback()
+    return jsonify({
+        'success': False,
+        'error': 409,
+        'message': "Conflict, the drink was changed by another request"
+    }), 409
+
+
 @app.errorhandler(AuthError)
 def auth_error(error):
     return jsonify({
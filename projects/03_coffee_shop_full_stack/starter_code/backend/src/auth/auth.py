@@ -1,13 +1,29 @@
 import json
+import os
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from fsnd_auth.jwks import JWKSCache, TokenVerifier
+from fsnd_auth.token_cache import TokenCache
 
 AUTH0_DOMAIN = 'dev-ii24r-9s.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee'
 
+# the key set is fetched once, kept in memory and refreshed by a background thread, see fsnd_auth/jwks.py
+jwks_cache = JWKSCache(
+    os.environ.get('JWKS_SOURCE', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'),
+    ttl=int(os.environ.get('JWKS_TTL', 3600)),
+    refresh_interval=float(os.environ['JWKS_REFRESH_INTERVAL']) if 'JWKS_REFRESH_INTERVAL' in os.environ else None
+)
+
+# payloads of the tokens already verified, see fsnd_auth/token_cache.py
+token_cache = TokenCache(
+    max_entries=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+    max_ttl=int(os.environ.get('TOKEN_CACHE_TTL', 300))
+)
+
 ## AuthError Exception
 '''
 AuthError Exception
@@ -19,6 +35,10 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+# verifies the signature and the claims of the tokens with the keys of jwks_cache
+verifier = TokenVerifier(jwks_cache, AUTH0_DOMAIN, API_AUDIENCE, ALGORITHMS, AuthError)
+
+
 ## Auth Header
 
 '''
@@ -61,25 +81,75 @@ def get_token_auth_header():
     token = parts[1]
     return token
 
+'''
+Permission expressions
+    requires_auth takes a permission string, or an expression made with any_of()
+    and all_of(), which can be nested:
+
+        @requires_auth(any_of('patch:drinks', all_of('post:drinks', 'delete:drinks')))
+
+    Expressions are compiled once, when the route is decorated, into a function of
+    the frozenset of the permissions of the token
+'''
+class PermissionExpression:
+    def __init__(self, mode, operands):
+        self.mode = mode
+        self.operands = operands
+
+
+def any_of(*permissions):
+    return PermissionExpression('any', permissions)
+
+
+def all_of(*permissions):
+    return PermissionExpression('all', permissions)
+
+
+'''
+compile_permission(expression)
+    returns a function which tells if a frozenset of permissions satisfies the expression
+'''
+def compile_permission(expression):
+    if isinstance(expression, str):
+        return lambda granted: expression in granted
+
+    if all(isinstance(operand, str) for operand in expression.operands):
+        required = frozenset(expression.operands)
+        if expression.mode == 'all':
+            return required.issubset
+        return lambda granted: not required.isdisjoint(granted)
+
+    checks = [compile_permission(operand) for operand in expression.operands]
+    if expression.mode == 'all':
+        return lambda granted: all(check(granted) for check in checks)
+    return lambda granted: any(check(granted) for check in checks)
+
+
 '''
 @DONE implement check_permissions(permission, payload) method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: string permission (i.e. 'post:drink'), permission expression
+            or the compiled function of an expression
         payload: decoded jwt payload
+        granted: frozenset of the permissions of the payload, built from the payload if not given
 
     it should raise an AuthError if permissions are not included in the payload
         !!NOTE check your RBAC settings in Auth0
     it should raise an AuthError if the requested permission string is not in the payload permissions array
     return true otherwise
 '''
-def check_permissions(permission, payload):
+def check_permissions(permission, payload, granted=None):
     if 'permissions' not in payload:
         raise AuthError({
             'code': 'invalid_claims',
             'description': 'Permissions not included in JWT.'
         }, 400)
 
-    if permission not in payload['permissions']:
+    if granted is None:
+        granted = frozenset(payload['permissions'])
+    check = permission if callable(permission) else compile_permission(permission)
+
+    if not check(granted):
         raise AuthError({
             'code': 'unauthorized',
             'description': 'Permission not found.'
@@ -92,7 +162,7 @@ def check_permissions(permission, payload):
         token: a json web token (string)
 
     it should be an Auth0 token with key id (kid)
-    it should verify the token using Auth0 /.well-known/jwks.json
+    it should verify the token using Auth0 /.well-known/jwks.json, read through jwks_cache (see TokenVerifier)
     it should decode the payload from the token
     it should validate the claims
     return the decoded payload
@@ -100,61 +170,26 @@ def check_permissions(permission, payload):
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-    unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    if 'kid' not in unverified_header:
-        raise AuthError({
-            'code': 'invalid_header',
-            'description': 'Authorization malformed.'
-        }, 401)
+    return verifier.verify(token)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    if rsa_key:
-        try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
-            return payload
-
-        except jwt.ExpiredSignatureError:
-            raise AuthError({
-                'code': 'token_expired',
-                'description': 'Token expired.'
-            }, 401)
-
-        except jwt.JWTClaimsError:
-            raise AuthError({
-                'code': 'invalid_claims',
-                'description': 'Incorrect claims. Please, check the audience and issuer.'
-            }, 401)
-        except Exception:
-            raise AuthError({
-                'code': 'invalid_header',
-                'description': 'Unable to parse authentication token.'
-            }, 400)
-    raise AuthError({
-        'code': 'invalid_header',
-        'description': 'Unable to find the appropriate key.'
-    }, 400)
+'''
+verify_token(token)
+    returns the payload of the token and the frozenset of its permissions. The token
+    is verified with verify_decode_jwt only the first time it is seen (until it expires)
+'''
+def verify_token(token):
+    verified = token_cache.get(token)
+    if verified is None:
+        payload = verify_decode_jwt(token)
+        verified = (payload, frozenset(payload.get('permissions', ())))
+        token_cache.put(token, verified, payload.get('exp'))
+    return verified
 
 '''
 @DONE implement @requires_auth(permission) decorator method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: string permission (i.e. 'post:drink') or permission expression (i.e. any_of(...)),
+            compiled once when the route is decorated
 
     it should use the get_token_auth_header method to get the token
     it should use the verify_decode_jwt method to decode the jwt
@@ -162,12 +197,14 @@ def verify_decode_jwt(token):
     return the decorator which passes the decoded payload to the decorated method
 '''
 def requires_auth(permission=''):
+    check = compile_permission(permission)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            payload, granted = verify_token(token)
+            check_permissions(check, payload, granted)
             
             return f(payload, *args, **kwargs)
         return wrapper
@@ -1,8 +1,11 @@
 import os
-from sqlalchemy import Column, String, Integer
+import threading
+from sqlalchemy import Column, String, Integer, JSON, inspect, text
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from fsnd_common.db_pool import engine_options
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
@@ -10,14 +13,31 @@ database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filenam
 db = SQLAlchemy()
 
 '''
-setup_db(app)
-    binds a flask application and a SQLAlchemy service
+setup_db(app, database_path)
+    binds a flask application and a SQLAlchemy service. Calling it again with another
+    database_path (e.g. a temporary database for the tests) switches the app to it
 '''
-def setup_db(app):
+def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
-    db.init_app(app)
+    if 'sqlalchemy' not in app.extensions:
+        db.init_app(app)
+
+'''
+db_upgrade()
+    adds the columns introduced since the database was created, keeping its records.
+    It is a migration step, run once per database with `flask upgrade-db`
+'''
+def db_upgrade():
+    tables = inspect(db.engine)
+    if 'drink' not in tables.get_table_names():
+        return
+    columns = [column['name'] for column in tables.get_columns('drink')]
+    if 'version' not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE drink ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
 
 '''
 db_drop_and_create_all()
@@ -38,33 +58,105 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, stored as JSON (no length limit)
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    recipe =  Column(JSON, nullable=False)
+    # incremented by every update, identifies the cached serializations of the drink
+    version = Column(Integer, nullable=False, default=1)
+
+    __mapper_args__ = {'version_id_col': version}
+
+    # functions called with the drink after it has been inserted, updated or deleted
+    listeners = []
+
+    # short() and long() of every drink, by id: {id: (version, short, long)}
+    serialized = {}
+    serialized_lock = threading.Lock()
+
+    '''
+    serialize()
+        returns the (short, long) representations of the drink, built once per version
+    '''
+    def serialize(self):
+        entry = Drink.serialized.get(self.id)
+        if entry is None or entry[0] != self.version:
+            entry = Drink.cache_serialized(self.id, self.title, self.recipe, self.version)
+        return entry[1], entry[2]
+
+    '''
+    projected()
+        query of the (id, title, recipe, version) rows of the drinks, the columns
+        the listings render, returned as tuples instead of ORM entities
+    '''
+    @classmethod
+    def projected(cls):
+        return db.session.query(cls.id, cls.title, cls.recipe, cls.version)
+
+    @classmethod
+    def cache_serialized(cls, id, title, recipe, version):
+        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+        entry = (version,
+            {'id': id, 'title': title, 'recipe': short_recipe},
+            {'id': id, 'title': title, 'recipe': recipe})
+        with cls.serialized_lock:
+            cls.serialized[id] = entry
+        return entry
+
+    '''
+    serialize_all(form)
+        returns the 'short' or 'long' representation of every drink, in id order.
+        Only the (id, version) of the drinks are read, the columns of the drinks whose
+        version is not cached yet are loaded with a single query, without ORM entities
+    '''
+    @classmethod
+    def serialize_all(cls, form='short'):
+        versions = db.session.query(cls.id, cls.version).order_by(cls.id).all()
+        missing = [id for id, version in versions
+                   if cls.serialized.get(id, (None,))[0] != version]
+        loaded = {}
+        if missing:
+            rows = cls.projected().filter(cls.id.in_(missing))
+            loaded = {row[0]: cls.cache_serialized(*row)[1:] for row in rows}
+
+        index = 0 if form == 'short' else 1
+        drinks = []
+        for id, version in versions:
+            serialized = loaded.get(id)
+            if serialized is None:
+                entry = cls.serialized.get(id)
+                if entry is not None:
+                    serialized = entry[1:]
+                else:
+                    # forgotten by an update or a delete since the query above
+                    row = cls.projected().filter(cls.id == id).one_or_none()
+                    if row is None:
+                        continue
+                    serialized = cls.cache_serialized(*row)[1:]
+            drinks.append(serialized[index])
+        return drinks
+
+    @classmethod
+    def forget(cls, id):
+        with cls.serialized_lock:
+            cls.serialized.pop(id, None)
+
+    def changed(self):
+        for listener in Drink.listeners:
+            listener(self)
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        # print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        return self.serialize()[0]
 
     '''
     long()
         long form representation of the Drink model
     '''
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        return self.serialize()[1]
 
     '''
     insert()
@@ -78,6 +170,7 @@ class Drink(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        self.changed()
 
     '''
     delete()
@@ -90,6 +183,8 @@ class Drink(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        Drink.forget(self.id)
+        self.changed()
 
     '''
     update()
@@ -102,6 +197,8 @@ class Drink(db.Model):
     '''
     def update(self):
         db.session.commit()
+        Drink.forget(self.id)
+        self.changed()
 
     def __repr__(self):
         return json.dumps(self.short())
\ No newline at end of file
@@ -0,0 +1,74 @@
+'''
+Snapshot of the drinks menu served by GET /drinks.
+
+The JSON body is built once and kept as bytes with a strong ETag. It is rebuilt
+when a drink is inserted, updated or deleted by this process, and at most
+MENU_SNAPSHOT_TTL seconds (default 60) after it was built, to pick up the
+changes made by the other worker processes. Clients revalidate it with
+If-None-Match; MENU_MAX_AGE (default 0) lets them reuse it without asking.
+'''
+
+import hashlib
+import os
+import threading
+import time
+
+from fsnd_common.serializer import dumps
+from .database.models import Drink
+
+
+class MenuSnapshot:
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.snapshot = None
+        # bumped by every invalidate(): a snapshot built from an older generation
+        # may miss a change committed while it was being built
+        self.generation = 0
+        self.generation_lock = threading.Lock()
+
+    def build(self, generation):
+        drinks = Drink.serialize_all('short')
+        body = dumps({
+            'success': True,
+            'drinks': drinks,
+            'status': 200
+        })
+        etag = hashlib.sha256(body).hexdigest()
+        return body, etag, len(drinks), time.monotonic(), generation
+
+    def expired(self, snapshot):
+        return snapshot is None or snapshot[4] != self.generation \
+            or time.monotonic() - snapshot[3] > self.ttl
+
+    '''
+    get()
+        returns the body of the menu, its ETag and its number of drinks. A snapshot
+        invalidated while it was being built is returned to its caller but not kept
+    '''
+    def get(self):
+        snapshot = self.snapshot
+        if self.expired(snapshot):
+            with self.lock:
+                snapshot = self.snapshot
+                if self.expired(snapshot):
+                    snapshot = self.build(self.generation)
+                    if snapshot[4] == self.generation:
+                        self.snapshot = snapshot
+        return snapshot[0], snapshot[1], snapshot[2]
+
+    def invalidate(self, drink=None):
+        with self.generation_lock:
+            self.generation += 1
+        self.snapshot = None
+
+
+def create_menu_snapshot():
+    menu = MenuSnapshot(int(os.environ.get('MENU_SNAPSHOT_TTL', 60)))
+    Drink.listeners.append(menu.invalidate)
+    return menu
+
+
+def cache_control():
+    max_age = int(os.environ.get('MENU_MAX_AGE', 0))
+    return 'public, max-age={}'.format(max_age) if max_age else 'public, no-cache'
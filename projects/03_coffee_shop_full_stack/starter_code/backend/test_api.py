@@ -0,0 +1,289 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+# the tokens of the tests are verified against a local key set, written in setUpClass
+JWKS_PATH = os.path.join(tempfile.gettempdir(), 'coffee-test-jwks.json')
+os.environ['JWKS_SOURCE'] = JWKS_PATH
+
+from fsnd_auth.jwks import JWKSCache
+from src.api import app, menu
+from src.auth.auth import AUTH0_DOMAIN, API_AUDIENCE, AuthError, all_of, any_of, check_permissions, token_cache
+from src.database.models import db, setup_db, Drink
+from src.menu import MenuSnapshot
+
+KID = 'test'
+
+
+def base64url(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class CoffeeShopTestCase(unittest.TestCase):
+    """This class represents the coffee shop test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        key = RSA.generate(2048)
+        with open(JWKS_PATH, 'w') as jwks_file:
+            json.dump({'keys': [{
+                'kty': 'RSA', 'kid': KID, 'use': 'sig', 'alg': 'RS256',
+                'n': base64url(key.n), 'e': base64url(key.e)
+            }]}, jwks_file)
+        cls.private_key = key.exportKey('PEM').decode('ascii')
+
+        # the tests write to a temporary database, not to the one of the repository
+        cls.database_dir = tempfile.mkdtemp()
+        setup_db(app, 'sqlite:///{}'.format(os.path.join(cls.database_dir, 'database.db')))
+        with app.app_context():
+            db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(JWKS_PATH)
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(cls.database_dir)
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.client = app.test_client
+        token_cache.clear()
+        # every test builds the menu from the drinks of the temporary database
+        menu.invalidate()
+        Drink.serialized.clear()
+
+        self.drink = Drink(title='Test drink {}'.format(time.time()),
+            recipe=[{'name': 'coffee', 'color': 'brown', 'parts': 1}])
+        with app.app_context():
+            self.drink.insert()
+            self.drink_id = self.drink.id
+
+    def tearDown(self):
+        """Executed after reach test"""
+        with app.app_context():
+            Drink.query.filter(Drink.title.like('Test drink %')).delete(synchronize_session=False)
+            Drink.query.filter(Drink.id == self.drink_id).delete(synchronize_session=False)
+            Drink.query.session.commit()
+
+    def headers(self, permissions, kid=KID):
+        claims = {
+            'iss': 'https://' + AUTH0_DOMAIN + '/',
+            'aud': API_AUDIENCE,
+            'sub': 'test',
+            'exp': int(time.time()) + 3600,
+            'permissions': permissions
+        }
+        token = jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': kid})
+        return {'Authorization': 'Bearer ' + token}
+
+    # get drinks detail with the get:drinks-detail permission should return success response
+    def test_200_get_drinks_detail(self):
+        res = self.client().get('/drinks-detail', headers=self.headers(['get:drinks-detail']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(any('name' in ingredient for drink in data['drinks'] for ingredient in drink['recipe']))
+
+
+    # get drinks detail without the permission should return 403 response
+    def test_403_get_drinks_detail_without_permission(self):
+        res = self.client().get('/drinks-detail', headers=self.headers(['post:drinks']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(data['success'], False)
+
+
+    # get drinks detail without token should return 401 response
+    def test_401_get_drinks_detail_without_token(self):
+        res = self.client().get('/drinks-detail')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(data['success'], False)
+
+
+    # post drink with the post:drinks permission should return success response
+    def test_200_post_drink(self):
+        res = self.client().post('/drinks', headers=self.headers(['post:drinks']), json={
+            'title': 'Test drink posted',
+            'recipe': [{'name': 'milk', 'color': 'white', 'parts': 2}]
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'][0]['title'], 'Test drink posted')
+
+
+    # post drink without the permission should return 403 response
+    def test_403_post_drink_without_permission(self):
+        res = self.client().post('/drinks', headers=self.headers(['get:drinks-detail']), json={
+            'title': 'Test drink forbidden',
+            'recipe': [{'name': 'milk', 'color': 'white', 'parts': 2}]
+        })
+
+        self.assertEqual(res.status_code, 403)
+
+
+    # patch drink with the patch:drinks permission should return success response
+    def test_200_patch_drink(self):
+        res = self.client().patch('/drinks/{}'.format(self.drink_id), headers=self.headers(['patch:drinks']),
+            json={'title': 'Test drink patched'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'][0]['title'], 'Test drink patched')
+
+
+    # get drinks should return the drinks of the database in their short form
+    def test_200_get_drinks(self):
+        res = self.client().get('/drinks')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['drinks'], [{'id': self.drink_id, 'title': self.drink.title,
+            'recipe': [{'color': 'brown', 'parts': 1}]}])
+
+
+    # get drinks should return 400 response once the last drink is deleted
+    def test_400_get_drinks_empty_menu(self):
+        self.assertEqual(self.client().get('/drinks').status_code, 200)
+        self.client().delete('/drinks/{}'.format(self.drink_id), headers=self.headers(['delete:drinks']))
+
+        res = self.client().get('/drinks')
+        self.assertEqual(res.status_code, 400)
+
+
+    # get drinks with the ETag of the menu should return 304 response, until a drink changes
+    def test_304_get_drinks_not_modified(self):
+        res = self.client().get('/drinks')
+        etag = res.headers['ETag']
+
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertIn('Cache-Control', res.headers)
+
+        self.client().patch('/drinks/{}'.format(self.drink_id), headers=self.headers(['patch:drinks']),
+            json={'title': 'Test drink renamed'})
+
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+
+    # the drinks served after a patch have the new recipe
+    def test_200_get_drinks_after_patch_recipe(self):
+        self.client().get('/drinks')
+        recipe = [{'name': 'tea', 'color': 'green', 'parts': 3}]
+        self.client().patch('/drinks/{}'.format(self.drink_id), headers=self.headers(['patch:drinks']),
+            json={'recipe': recipe})
+
+        res = self.client().get('/drinks')
+        data = json.loads(res.data)
+        drink = [drink for drink in data['drinks'] if drink['id'] == self.drink_id][0]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(drink['recipe'], [{'color': 'green', 'parts': 3}])
+
+
+    # a snapshot built while a drink changes is served to its request but not kept
+    def test_menu_snapshot_discarded_after_invalidation(self):
+        snapshot = MenuSnapshot()
+        build = snapshot.build
+
+        def build_during_a_write(generation):
+            built = build(generation)
+            snapshot.invalidate()
+            return built
+        snapshot.build = build_during_a_write
+
+        with app.app_context():
+            body, etag, drinks_count = snapshot.get()
+        self.assertEqual(drinks_count, 1)
+        self.assertIsNone(snapshot.snapshot)
+
+
+    # patch drink without the permission should return 403 response
+    def test_403_patch_drink_without_permission(self):
+        res = self.client().patch('/drinks/{}'.format(self.drink_id), headers=self.headers(['delete:drinks']),
+            json={'title': 'Test drink forbidden'})
+
+        self.assertEqual(res.status_code, 403)
+
+
+    # delete drink with the delete:drinks permission should return success response
+    def test_200_delete_drink(self):
+        res = self.client().delete('/drinks/{}'.format(self.drink_id), headers=self.headers(['delete:drinks']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['delete'], self.drink_id)
+
+
+    # delete drink without the permission should return 403 response
+    def test_403_delete_drink_without_permission(self):
+        res = self.client().delete('/drinks/{}'.format(self.drink_id), headers=self.headers(['patch:drinks']))
+
+        self.assertEqual(res.status_code, 403)
+
+
+    # permission expressions combine permissions with any_of and all_of
+    def test_permission_expressions(self):
+        payload = {'permissions': ['get:drinks-detail', 'post:drinks']}
+
+        self.assertTrue(check_permissions(any_of('patch:drinks', 'post:drinks'), payload))
+        self.assertTrue(check_permissions(all_of('get:drinks-detail', 'post:drinks'), payload))
+        self.assertTrue(check_permissions(any_of('delete:drinks', all_of('get:drinks-detail', 'post:drinks')), payload))
+        with self.assertRaises(AuthError):
+            check_permissions(all_of('get:drinks-detail', 'patch:drinks'), payload)
+        with self.assertRaises(AuthError):
+            check_permissions(any_of('patch:drinks', 'delete:drinks'), payload)
+
+
+    # a token signed with an unknown key should return 400 response and be counted as a key miss
+    def test_400_unknown_key(self):
+        self.client().get('/drinks-detail', headers=self.headers(['get:drinks-detail']))
+        misses = self.client().get('/metrics/auth').get_json()['jwks']['key_misses']
+
+        res = self.client().get('/drinks-detail', headers=self.headers(['get:drinks-detail'], kid='rotated'))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+        metrics = self.client().get('/metrics/auth').get_json()['jwks']
+        self.assertEqual(metrics['key_misses'], misses + 1)
+        self.assertGreaterEqual(metrics['fetches'], 1)
+
+
+    # once the keys are warm, a stale key set is served while a failing fetch runs in the background
+    def test_jwks_cache_serves_warm_keys(self):
+        cache = JWKSCache(JWKS_PATH, ttl=0, min_refresh_interval=0, refresh_interval=0)
+        self.assertIsNotNone(cache.get_key(KID))
+
+        cache.source = JWKS_PATH + '.missing'
+        self.assertIsNotNone(cache.get_key(KID))
+        for _ in range(100):
+            if cache.metrics()['fetches'] == 2:
+                break
+            time.sleep(0.01)
+
+        metrics = cache.metrics()
+        self.assertEqual(metrics['key_hits'], 2)
+        self.assertEqual(metrics['fetches'], 2)
+        self.assertEqual(metrics['fetch_failures'], 1)
+        self.assertIsNotNone(cache.get_key(KID))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
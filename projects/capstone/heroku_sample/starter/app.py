@@ -1,12 +1,14 @@
 import os
 from flask import Flask
-from models import setup_db
+from models import setup_db, db
+from db_pool import register_pool_metrics
 
 def create_app(test_config=None):
 
     app = Flask(__name__)
     setup_db(app)
     CORS(app)
+    register_pool_metrics(app, db)
 
     @app.route('/')
     def get_greeting():